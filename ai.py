@@ -1,22 +1,79 @@
 import requests
+import ast
 import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-API_KEY = ""
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_KEY = os.environ.get("AI_API_KEY", "")
 
 MODEL_URI = "gpt://b1gmp22ofau2s0p24gd2/yandexgpt-lite"
 FOLDER_ID = "b1gmp22ofau2s0p24gd2"
 
-URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+URL = os.environ.get("AI_URL", "https://llm.api.cloud.yandex.net/foundationModels/v1/completion")
 
-def generate_task(difficulty, subject_admin):
-    headers = {
-        "Authorization": f"Api-Key {API_KEY}",
-        "Content-Type": "application/json"
+TIMEOUT = (5, 60)
+MAX_CONCURRENCY = int(os.environ.get("AI_CONCURRENCY", 4))
+MAX_RETRIES = 3
+BACKOFF = 1
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S | re.I)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+EMPTY_VALUE = re.compile(r":\s*(?=[,}])")
+SINGLE_QUOTED_KEY = re.compile(r"'([^'\n]*)'(\s*:)")
+STRING_END = re.compile(r"\s*(?:[,:}\]]|$)")
+NUMBER = re.compile(r"\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Zа-яА-Я]*)")
+
+TEST_COUNT = 5
+
+_client = {"session": None}
+_client_lock = threading.Lock()
+_limit = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+
+def _session():
+    with _client_lock:
+        if _client["session"] is None:
+            retry = Retry(total=MAX_RETRIES, backoff_factor=BACKOFF, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset(["POST"]), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Content-Type"] = "application/json"
+            _client["session"] = session
+        return _client["session"]
+
+
+def complete(messages, temperature=0.8, max_tokens=1000):
+    data = {
+        "modelUri": MODEL_URI,
+        "completionOptions": {
+            "stream": False,
+            "temperature": temperature,
+            "maxTokens": max_tokens
+        },
+        "messages": messages
     }
+    with _limit:
+        response = _session().post(URL, headers={"Authorization": f"Api-Key {API_KEY}"}, json=data,
+                                   timeout=TIMEOUT)
+    response.raise_for_status()
+    result = response.json()
+    return result["result"]["alternatives"][0]["message"]["text"]
+
+
+def generate_task(difficulty, subject_admin):
     if subject_admin == 'информатика':
         prompt = f"""
         Напиши условие для олимпиадной задачи по предмету: {subject_admin}, сложность задачи: {difficulty}
         в лимит времени укажи только число без букв и единиц измерения,
+        в эталонное решение напиши программу на Python 3, которая читает входные данные из стандартного ввода и печатает ответ,
+        выходные данные каждого теста должны в точности совпадать с выводом эталонного решения на входных данных этого теста,
         КАТЕГОРИЧЕСКИ НЕ ИСПОЛЬЗУЙ В СВОИХ СТРОКАХ ОДИНОЧНЫЙ \", ДВОЙНОЙ \\" И ВООБЩЕ НЕ ИСПОЛЬЗУЙ ЗНАКИ, КОТОРЫЕ МОГУТ ПОМЕШАТЬ МЕТОДУ json.loads.
         не используй в своих строках специальные символы для форматирования строки, такие как $ или \" и другие пиши просто текст.
         ответ верни строго в формате JSON:
@@ -37,7 +94,8 @@ def generate_task(difficulty, subject_admin):
         'входные данные тест 4': "",
         'выходные данные тест 4': "",
         'входные данные тест 5': "",
-        'выходные данные тест 5': ""
+        'выходные данные тест 5': "",
+        'эталонное решение': ""
         }}
         Не добавляй комментарии.
         Не добавляй markdown.
@@ -63,14 +121,7 @@ def generate_task(difficulty, subject_admin):
             Не добавляй markdown.
             Только JSON.
             """
-    data = {
-    "modelUri": MODEL_URI,
-    "completionOptions": {
-        "stream": False,
-        "temperature": 0.8,
-        "maxTokens": 1000
-    },
-    "messages": [
+    messages = [
         {
             "role": "system",
             "text": "Ты генератор олимпиадных задач по различным предметам. Ты должен создавать задачи, которые соответствуют заданной сложности и предмету. Ответ должен быть строго в формате JSON, без комментариев и markdown."
@@ -80,14 +131,115 @@ def generate_task(difficulty, subject_admin):
             "text": prompt
         }
     ]
-    }
 
-    response = requests.post(URL, headers=headers, json=data)
+    try:
+        text = complete(messages)
+    except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+        return {"error": f"AI request failed: {e}"}
+    return parse_task(text, subject_admin)
+
 
-    result = response.json()
+def generate_batch(grid, count=1, workers=MAX_CONCURRENCY):
+    jobs = [(subject, difficulty) for subject, difficulty in grid for _ in range(count)]
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs) or 1))) as executor:
+        tasks = executor.map(lambda job: generate_task(job[1], job[0]), jobs)
+        for (subject, difficulty), task in zip(jobs, tasks):
+            results.setdefault((subject, difficulty), [])
+            if task.get("error") is None:
+                results[(subject, difficulty)].append(task)
+    return results
+
+
+def parse_task(text, subject):
+    task = _loads(_extract(text or ""))
+    if task is None:
+        return {"error": "Failed to parse AI response"}
+    task = {" ".join(str(key).lower().split()): _text(value) for key, value in task.items()}
+    error = validate_task(task, subject)
+    if error:
+        return {"error": error}
+    return task
+
+
+def validate_task(task, subject):
+    for field in ("название задачи", "условие задачи"):
+        if not task.get(field):
+            return f"Missing field: {field}"
+    if subject != 'информатика':
+        if not task.get("ответ"):
+            return "Missing field: ответ"
+        return None
+    for i in range(1, TEST_COUNT + 1):
+        for field in (f"входные данные тест {i}", f"выходные данные тест {i}"):
+            if not task.get(field):
+                return f"Missing field: {field}"
+    if task.get("лимит времени"):
+        match = NUMBER.match(task["лимит времени"])
+        if not match:
+            return f"Time limit is not a number: {task['лимит времени']}"
+        task["лимит времени"] = match.group(1).replace(",", ".")
+    if task.get("лимит памяти"):
+        match = NUMBER.match(task["лимит памяти"])
+        if not match:
+            return f"Memory limit is not a number: {task['лимит памяти']}"
+        task["лимит памяти"] = match.group(0).strip()
+    return None
 
-    text = result["result"]["alternatives"][0]["message"]["text"]
+
+def _extract(text):
+    fenced = FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    return text.strip()
+
+
+def _loads(text):
+    cleaned = EMPTY_VALUE.sub(': ""', TRAILING_COMMA.sub(r"\1", text))
+    quoted = SINGLE_QUOTED_KEY.sub(r'"\1"\2', cleaned)
+    for candidate in (text, cleaned, quoted, _escape_inner_quotes(quoted),
+                      quoted.replace("“", '"').replace("”", '"')):
+        try:
+            value = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
     try:
-        return json.loads(text[4:-4])
-    except json.JSONDecodeError:
-        return {"error": "Failed to parse AI response"}
\ No newline at end of file
+        value = ast.literal_eval(cleaned)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _escape_inner_quotes(text):
+    result = []
+    in_string = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string and char == "\\":
+            result.append(text[i:i + 2])
+            i += 2
+            continue
+        if char == '"':
+            if not in_string:
+                in_string = True
+            elif STRING_END.match(text, i + 1):
+                in_string = False
+            else:
+                char = '\\"'
+        result.append(char)
+        i += 1
+    return "".join(result)
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "\n".join(_text(item) for item in value)
+    return str(value).strip()
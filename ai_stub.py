@@ -0,0 +1,61 @@
+import json
+import random
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _task(subject, number):
+    if subject == 'информатика':
+        a, b = random.randint(1, 100), random.randint(1, 100)
+        task = {
+            "тема": "арифметика",
+            "название задачи": f"Сумма чисел {number}",
+            "условие задачи": "Даны два целых числа a и b. Выведите их сумму.",
+            "лимит памяти": "64",
+            "лимит времени": "1",
+            "входные данные": "Два целых числа a и b через пробел",
+            "выходные данные": "Одно число - сумма a и b",
+        }
+        for i in range(1, 6):
+            task[f"входные данные тест {i}"] = f"{a + i} {b}"
+            task[f"выходные данные тест {i}"] = str(a + i + b)
+        task["эталонное решение"] = "a, b = map(int, input().split())\nprint(a + b)"
+        if number % 4 == 0:
+            task["выходные данные тест 3"] = "0"
+        return task
+    return {
+        "тема": "разминка",
+        "название задачи": f"Задача {number}",
+        "условие задачи": "Сколько будет дважды два?",
+        "ответ": "4",
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    counter = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = body.get("messages", [{}])[-1].get("text", "")
+        subject = 'информатика' if "предмету: информатика" in prompt else 'другое'
+        Handler.counter += 1
+        text = "```\n" + json.dumps(_task(subject, Handler.counter), ensure_ascii=False) + "\n```"
+        data = json.dumps({"result": {"alternatives": [{"message": {"role": "assistant", "text": text}}]}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data.encode("utf-8"))))
+        self.end_headers()
+        self.wfile.write(data.encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8765):
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Заглушка ИИ запущена: AI_URL=http://127.0.0.1:{port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
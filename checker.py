@@ -0,0 +1,175 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import storage
+
+DEFAULT_EPS = 1e-6
+CUSTOM_CHECKER_TIMEOUT = 10
+
+
+def parse(value):
+    value = (value or "tokens").strip()
+    if value.startswith("float"):
+        _, _, eps = value.partition(":")
+        try:
+            return {"mode": "float", "eps": float(eps) if eps else DEFAULT_EPS}
+        except ValueError:
+            return {"mode": "float", "eps": DEFAULT_EPS}
+    if value.startswith("custom:"):
+        return {"mode": "custom", "checker_hash": value[len("custom:"):]}
+    return {"mode": "tokens"}
+
+
+def validate_spec(value):
+    value = (value or "").strip()
+    if value in ("", "tokens", "float"):
+        return None
+    mode, _, argument = value.partition(":")
+    if mode == "float":
+        try:
+            if float(argument) > 0:
+                return None
+        except ValueError:
+            pass
+        return f"Некорректная точность «{argument}»"
+    if mode == "custom":
+        if re.fullmatch(r"[0-9a-f]{64}", argument) and storage.exists(argument):
+            return None
+        return "Чекер с таким хэшем не найден, загрузите файл чекера"
+    return f"Неизвестный способ проверки «{value}»"
+
+
+def iter_chunks(text=None, path=None):
+    if path:
+        with storage.open_path(path) as f:
+            while True:
+                chunk = f.read(storage.CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    elif text:
+        yield text.encode("utf-8")
+
+
+class TokenStream:
+    def __init__(self):
+        self._partial = b""
+
+    def feed(self, data):
+        data = self._partial + data
+        tokens = data.split()
+        if tokens and not data[-1:].isspace():
+            self._partial = tokens.pop()
+        else:
+            self._partial = b""
+        return tokens
+
+    def close(self):
+        partial, self._partial = self._partial, b""
+        return [partial] if partial else []
+
+
+class TokenChecker:
+    def __init__(self, expected_chunks, eps=None):
+        self._expected = self._tokens(expected_chunks)
+        self._actual = TokenStream()
+        self._eps = eps
+        self.failed = False
+
+    @staticmethod
+    def _tokens(chunks):
+        stream = TokenStream()
+        for chunk in chunks:
+            yield from stream.feed(chunk)
+        yield from stream.close()
+
+    def _match(self, token):
+        expected = next(self._expected, None)
+        if expected is None:
+            return False
+        if token == expected:
+            return True
+        if self._eps is None:
+            return False
+        try:
+            a, b = float(token), float(expected)
+        except ValueError:
+            return False
+        return abs(a - b) <= self._eps * max(1.0, abs(b))
+
+    def feed(self, data):
+        if self.failed:
+            return False
+        for token in self._actual.feed(data):
+            if not self._match(token):
+                self.failed = True
+                return False
+        return True
+
+    def finish(self):
+        if self.failed:
+            return False
+        for token in self._actual.close():
+            if not self._match(token):
+                return False
+        return next(self._expected, None) is None
+
+    def close(self):
+        pass
+
+
+class CustomChecker:
+    def __init__(self, checker_path, input_chunks, expected_chunks):
+        self._checker_path = checker_path
+        self._dir = tempfile.TemporaryDirectory()
+        self._input = self._write("input.txt", input_chunks)
+        self._expected = self._write("expected.txt", expected_chunks)
+        self._output_path = os.path.join(self._dir.name, "output.txt")
+        self._output = open(self._output_path, "wb")
+        self.failed = False
+
+    def _write(self, name, chunks):
+        file_path = os.path.join(self._dir.name, name)
+        with open(file_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return file_path
+
+    def feed(self, data):
+        self._output.write(data)
+        return True
+
+    def finish(self):
+        self._output.close()
+        with tempfile.NamedTemporaryFile("wb", suffix=".py", dir=self._dir.name, delete=False) as f:
+            with storage.open_path(self._checker_path) as src:
+                f.write(src.read())
+        try:
+            completed = subprocess.run(
+                [sys.executable, f.name, self._input, self._expected, self._output_path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=CUSTOM_CHECKER_TIMEOUT
+            )
+        except subprocess.TimeoutExpired:
+            return False
+        return completed.returncode == 0
+
+    def close(self):
+        if not self._output.closed:
+            self._output.close()
+        self._dir.cleanup()
+
+
+def create(spec):
+    expected = iter_chunks(spec.get("expected"), spec.get("expected_path"))
+    if spec.get("mode") == "custom":
+        return CustomChecker(spec["checker_path"],
+                             iter_chunks(spec.get("input"), spec.get("input_path")),
+                             expected)
+    if spec.get("mode") == "float":
+        return TokenChecker(expected, eps=spec.get("eps", DEFAULT_EPS))
+    return TokenChecker(expected)
@@ -1,4 +1,15 @@
 from . import users
 from . import tasks
 from . import task_tests
-from . import submissions
\ No newline at end of file
+from . import submissions
+from . import judge_jobs
+from . import test_results
+from . import verdict_cache
+from . import user_task_stats
+from . import theme_stats
+from . import analytics_rollups
+from . import rollup_state
+from . import schema_migrations
+from . import ai_pool_tasks
+from . import task_signatures
+from . import task_signature_bands
\ No newline at end of file
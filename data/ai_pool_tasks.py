@@ -0,0 +1,19 @@
+import datetime
+import sqlalchemy
+
+from .db_session import SqlAlchemyBase
+
+
+class AiPoolTask(SqlAlchemyBase):
+    __tablename__ = 'ai_pool_tasks'
+    __table_args__ = (
+        sqlalchemy.Index("ix_ai_pool_tasks_subject_difficulty", "subject", "difficulty"),
+    )
+
+    id = sqlalchemy.Column(sqlalchemy.Integer,
+                           primary_key=True, autoincrement=True)
+    subject = sqlalchemy.Column(sqlalchemy.Text, nullable=False)
+    difficulty = sqlalchemy.Column(sqlalchemy.Text, nullable=False)
+    payload = sqlalchemy.Column(sqlalchemy.Text, nullable=False)
+    created_at = sqlalchemy.Column(sqlalchemy.DateTime,
+                                   default=datetime.datetime.now)
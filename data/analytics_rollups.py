@@ -0,0 +1,20 @@
+import sqlalchemy
+
+from .db_session import SqlAlchemyBase
+
+
+class AnalyticsRollup(SqlAlchemyBase):
+    __tablename__ = 'analytics_rollups'
+    __table_args__ = (sqlalchemy.UniqueConstraint("period", "bucket", "subject", "theme", "difficulty"),)
+
+    id = sqlalchemy.Column(sqlalchemy.Integer,
+                           primary_key=True, autoincrement=True)
+    period = sqlalchemy.Column(sqlalchemy.String(8))
+    bucket = sqlalchemy.Column(sqlalchemy.DateTime)
+    subject = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    theme = sqlalchemy.Column(sqlalchemy.Text)
+    difficulty = sqlalchemy.Column(sqlalchemy.Text)
+    total = sqlalchemy.Column(sqlalchemy.Integer, default=0)
+    ok = sqlalchemy.Column(sqlalchemy.Integer, default=0)
+    solve_time_sum = sqlalchemy.Column(sqlalchemy.Float, default=0)
+    solved_count = sqlalchemy.Column(sqlalchemy.Integer, default=0)
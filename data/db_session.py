@@ -1,3 +1,6 @@
+import contextlib
+import contextvars
+
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 from sqlalchemy.orm import Session
@@ -6,25 +9,127 @@ SqlAlchemyBase = orm.declarative_base()
 
 __factory = None
 
-def global_init(db_file):
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 10000,
+    "mmap_size": 256 * 1024 ** 2,
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+}
+
+_scope = contextvars.ContextVar("db_session_scope", default=None)
+
+
+def global_init(database, pragmas=None, pool_size=10, max_overflow=20, pool_timeout=30):
     global __factory
 
     if __factory:
         return
 
-    if not db_file or not db_file.strip():
-        raise Exception("Необходимо указать файл базы данных.")
-
-    conn_str = f'sqlite:///{db_file.strip()}?check_same_thread=False'
-    print(f"Подключение к базе данных по адресу {conn_str}")
+    if not database or not database.strip():
+        raise Exception("Необходимо указать файл или адрес базы данных.")
 
-    engine = sa.create_engine(conn_str, echo=False)
+    engine = create_engine(database, pragmas=pragmas, pool_size=pool_size,
+                           max_overflow=max_overflow, pool_timeout=pool_timeout)
+    print(f"Подключение к базе данных по адресу {engine.url.render_as_string(hide_password=True)}")
     __factory = orm.sessionmaker(bind=engine)
 
-    from . import __all_models
+    from . import migrations
+
+    migrations.upgrade(engine)
+
+
+def database_url(database):
+    database = database.strip()
+    if "://" in database:
+        url = sa.engine.make_url(database)
+        # SQLAlchemy 2.1 defaults to psycopg 3, requirements ship psycopg2
+        if url.drivername == "postgresql":
+            url = url.set(drivername="postgresql+psycopg2")
+        return url
+    return sa.engine.make_url(f'sqlite:///{database}?check_same_thread=False')
+
+
+def create_engine(database, pragmas=None, pool_size=10, max_overflow=20, pool_timeout=30):
+    url = database_url(database)
+    options = {
+        "echo": False,
+        "poolclass": sa.pool.QueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_pre_ping": True
+    }
+    if url.get_backend_name() == "sqlite":
+        connect_args = {"check_same_thread": False}
+        if not url.database or url.database == ":memory:":
+            return sa.create_engine(url, echo=False, poolclass=sa.pool.StaticPool, connect_args=connect_args)
+        engine = sa.create_engine(url, connect_args=connect_args, **options)
+        _set_pragmas(engine, dict(SQLITE_PRAGMAS, **(pragmas or {})))
+        return engine
+    if url.get_backend_name() == "postgresql":
+        options["pool_recycle"] = 1800
+        options["connect_args"] = {"application_name": "olympiad"}
+    return sa.create_engine(url, **options)
+
+
+def _set_pragmas(engine, pragmas):
+    @sa.event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                if value is not None:
+                    cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
 
-    SqlAlchemyBase.metadata.create_all(engine)
 
-def create_session() -> Session:
+class _Scope:
+    def __init__(self):
+        self.session = None
+        self.extra = []
+
+
+def create_session(track=True) -> Session:
     global __factory
-    return __factory()
\ No newline at end of file
+    session = __factory()
+    scope = _scope.get()
+    if track and scope is not None:
+        scope.extra.append(session)
+    return session
+
+
+def get_session() -> Session:
+    scope = _scope.get()
+    if scope is None:
+        return create_session()
+    if scope.session is None:
+        scope.session = __factory()
+    return scope.session
+
+
+def open_scope():
+    _scope.set(_Scope())
+
+
+def close_scope():
+    scope = _scope.get()
+    _scope.set(None)
+    if scope is None:
+        return
+    for session in [scope.session] + scope.extra:
+        if session is not None:
+            session.close()
+
+
+@contextlib.contextmanager
+def scope():
+    outer = _scope.get()
+    open_scope()
+    try:
+        yield
+    finally:
+        close_scope()
+        _scope.set(outer)
@@ -0,0 +1,19 @@
+import datetime
+import sqlalchemy
+from sqlalchemy import orm
+
+from .db_session import SqlAlchemyBase
+
+
+class JudgeJob(SqlAlchemyBase):
+    __tablename__ = 'judge_jobs'
+
+    id = sqlalchemy.Column(sqlalchemy.Integer,
+                           primary_key=True, autoincrement=True)
+    submission_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                      sqlalchemy.ForeignKey("submissions.id"))
+    room = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    status = sqlalchemy.Column(sqlalchemy.Text, default="pending", index=True)
+    created_at = sqlalchemy.Column(sqlalchemy.DateTime,
+                                   default=datetime.datetime.now)
+    submission = orm.relationship("Submissions")
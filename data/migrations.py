@@ -0,0 +1,116 @@
+import datetime
+
+import sqlalchemy as sa
+
+from .db_session import SqlAlchemyBase
+
+
+def _analyze(conn):
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _index_tasks(conn):
+    import dedup
+    from .tasks import Tasks
+    from .task_signatures import TaskSignature
+    from .task_signature_bands import TaskSignatureBand
+
+    tasks = Tasks.__table__
+    signatures, bands = [], []
+    for task_id, subject, title, statement in conn.execute(
+            sa.select(tasks.c.id, tasks.c.subject, tasks.c.title, tasks.c.statement)):
+        sig = dedup.signature(title, statement)
+        if sig is None:
+            continue
+        signatures.append({"task_id": task_id, "subject": subject, "signature": sig})
+        bands += [{"task_id": task_id, "bucket": bucket} for bucket in dedup.buckets(sig)]
+    if signatures:
+        conn.execute(TaskSignature.__table__.insert(), signatures)
+        conn.execute(TaskSignatureBand.__table__.insert(), bands)
+
+
+# one-off steps that can't be derived from the models; append new ones, never renumber
+MIGRATIONS = [
+    (1, "analyze_route_indexes", _analyze),
+    (2, "index_task_signatures", _index_tasks),
+]
+
+
+def upgrade(engine):
+    from . import __all_models
+    from .schema_migrations import SchemaMigration
+
+    SqlAlchemyBase.metadata.create_all(engine)
+    add_missing_columns(engine)
+    add_missing_indexes(engine)
+
+    table = SchemaMigration.__table__
+    with engine.begin() as conn:
+        applied = {row[0] for row in conn.execute(sa.select(table.c.version))}
+    for version, name, step in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(table.insert().values(version=version, name=name, applied_at=datetime.datetime.now()))
+        print(f"Применена миграция {version}: {name}")
+
+
+def add_missing_columns(engine):
+    inspector = sa.inspect(engine)
+    with engine.begin() as conn:
+        for table in SqlAlchemyBase.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(sa.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def add_missing_indexes(engine):
+    inspector = sa.inspect(engine)
+    with engine.begin() as conn:
+        for table in SqlAlchemyBase.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    print(f"Создание индекса {index.name}")
+                    index.create(conn)
+
+
+def copy_database(source, target, batch_size=1000):
+    from . import __all_models
+    from .db_session import create_engine
+
+    source_engine = create_engine(source)
+    target_engine = create_engine(target)
+    upgrade(source_engine)
+    upgrade(target_engine)
+
+    copied = {}
+    with source_engine.connect() as src, target_engine.begin() as dst:
+        for table in SqlAlchemyBase.metadata.sorted_tables:
+            if table.name == "schema_migrations":
+                continue
+            if dst.execute(sa.select(sa.func.count()).select_from(table)).scalar():
+                raise Exception(f"Таблица {table.name} в целевой базе уже содержит данные.")
+            rows = src.execution_options(yield_per=batch_size).execute(sa.select(table))
+            count = 0
+            for chunk in rows.mappings().partitions():
+                dst.execute(table.insert(), [dict(row) for row in chunk])
+                count += len(chunk)
+            copied[table.name] = count
+        if target_engine.dialect.name == "postgresql":
+            for table in SqlAlchemyBase.metadata.sorted_tables:
+                if table.name == "schema_migrations":
+                    continue
+                for column in table.primary_key.columns:
+                    if isinstance(column.type, sa.Integer):
+                        dst.execute(sa.text(
+                            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column.name}'), "
+                            f"COALESCE((SELECT MAX({column.name}) FROM {table.name}), 0) + 1, false)"
+                        ))
+    source_engine.dispose()
+    target_engine.dispose()
+    return copied
@@ -0,0 +1,23 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from .submissions import Submissions
+from .tasks import Tasks
+from .user_task_stats import UserTaskStats
+
+
+def submissions_with_details(db_sess):
+    return db_sess.query(Submissions).options(
+        joinedload(Submissions.tasks),
+        joinedload(Submissions.user)
+    )
+
+
+def task_with_tests(db_sess, task_id):
+    return db_sess.get(Tasks, task_id, options=[selectinload(Tasks.task_tests)])
+
+
+def user_task_stats(db_sess, user_id):
+    return db_sess.query(UserTaskStats).options(
+        joinedload(UserTaskStats.task),
+        joinedload(UserTaskStats.best_submission)
+    ).filter(UserTaskStats.user_id == user_id)
@@ -0,0 +1,10 @@
+import sqlalchemy
+
+from .db_session import SqlAlchemyBase
+
+
+class RollupState(SqlAlchemyBase):
+    __tablename__ = 'rollup_state'
+
+    name = sqlalchemy.Column(sqlalchemy.String(32), primary_key=True)
+    last_id = sqlalchemy.Column(sqlalchemy.Integer, default=0)
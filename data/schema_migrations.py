@@ -0,0 +1,13 @@
+import datetime
+import sqlalchemy
+
+from .db_session import SqlAlchemyBase
+
+
+class SchemaMigration(SqlAlchemyBase):
+    __tablename__ = 'schema_migrations'
+
+    version = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    name = sqlalchemy.Column(sqlalchemy.Text)
+    applied_at = sqlalchemy.Column(sqlalchemy.DateTime,
+                                   default=datetime.datetime.now)
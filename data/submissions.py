@@ -4,9 +4,17 @@ from sqlalchemy import orm
 
 from .db_session import SqlAlchemyBase
 
+PENDING_VERDICT = "В очереди"
+
 
 class Submissions(SqlAlchemyBase):
     __tablename__ = 'submissions'
+    __table_args__ = (
+        sqlalchemy.Index("ix_submissions_user_task_created", "user_id", "task_id", "created_at"),
+        sqlalchemy.Index("ix_submissions_task_verdict", "task_id", "verdict"),
+        sqlalchemy.Index("ix_submissions_verdict", "verdict"),
+        sqlalchemy.Index("ix_submissions_created_at", "created_at"),
+    )
 
     id = sqlalchemy.Column(sqlalchemy.Integer,
                            primary_key=True, autoincrement=True)
@@ -16,7 +24,10 @@ class Submissions(SqlAlchemyBase):
                                 sqlalchemy.ForeignKey("tasks.id"))
     total_tests = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
     verdict = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    source_hash = sqlalchemy.Column(sqlalchemy.String(64), nullable=True)
     created_at = sqlalchemy.Column(sqlalchemy.DateTime,
                                      default=datetime.datetime.now)
     tasks = orm.relationship('Tasks', back_populates="submissions")
-    user = orm.relationship("User", back_populates="submissions")
\ No newline at end of file
+    user = orm.relationship("User", back_populates="submissions")
+    test_results = orm.relationship("TestResult", back_populates="submission",
+                                    cascade="all, delete-orphan")
\ No newline at end of file
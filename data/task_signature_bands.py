@@ -0,0 +1,11 @@
+import sqlalchemy
+
+from .db_session import SqlAlchemyBase
+
+
+class TaskSignatureBand(SqlAlchemyBase):
+    __tablename__ = 'task_signature_bands'
+
+    task_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                sqlalchemy.ForeignKey("task_signatures.task_id"), primary_key=True)
+    bucket = sqlalchemy.Column(sqlalchemy.String(24), primary_key=True, index=True)
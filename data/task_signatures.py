@@ -0,0 +1,14 @@
+import sqlalchemy
+from sqlalchemy import orm
+
+from .db_session import SqlAlchemyBase
+
+
+class TaskSignature(SqlAlchemyBase):
+    __tablename__ = 'task_signatures'
+
+    task_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                sqlalchemy.ForeignKey("tasks.id"), primary_key=True)
+    subject = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    signature = sqlalchemy.Column(sqlalchemy.Text, nullable=False)
+    task = orm.relationship("Tasks", back_populates="signature")
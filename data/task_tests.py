@@ -1,6 +1,7 @@
 import sqlalchemy
 from sqlalchemy import orm
 
+import storage
 from .db_session import SqlAlchemyBase
 
 
@@ -9,7 +10,39 @@ class TaskTest(SqlAlchemyBase):
     id = sqlalchemy.Column(sqlalchemy.Integer,
                            primary_key=True, autoincrement=True)
     task_id = sqlalchemy.Column(sqlalchemy.Integer,
-                                sqlalchemy.ForeignKey("tasks.id"))
+                                sqlalchemy.ForeignKey("tasks.id"), index=True)
     input_data = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     output = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    input_hash = sqlalchemy.Column(sqlalchemy.String(64), nullable=True)
+    output_hash = sqlalchemy.Column(sqlalchemy.String(64), nullable=True)
     tasks = orm.relationship("Tasks", back_populates='task_tests')
+
+    def set_data(self, input_data, output=None):
+        self.input_data, self.input_hash = _split(input_data)
+        self.output, self.output_hash = _split(output)
+
+    def get_input(self):
+        if self.input_hash:
+            return storage.read_text(self.input_hash)
+        return self.input_data
+
+    def get_output(self):
+        if self.output_hash:
+            return storage.read_text(self.output_hash)
+        return self.output
+
+    def input_path(self):
+        if self.input_hash:
+            return storage.path(self.input_hash)
+        return None
+
+    def output_path(self):
+        if self.output_hash:
+            return storage.path(self.output_hash)
+        return None
+
+
+def _split(value):
+    if value is not None and len(value) > storage.INLINE_LIMIT:
+        return None, storage.put(value)
+    return value, None
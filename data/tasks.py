@@ -7,6 +7,10 @@ from .db_session import SqlAlchemyBase
 
 class Tasks(SqlAlchemyBase):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        sqlalchemy.Index("ix_tasks_subject_theme_difficulty", "subject", "theme", "difficulty"),
+        sqlalchemy.Index("ix_tasks_subject_difficulty", "subject", "difficulty"),
+    )
 
     id = sqlalchemy.Column(sqlalchemy.Integer,
                            primary_key=True, autoincrement=True)
@@ -15,11 +19,17 @@ class Tasks(SqlAlchemyBase):
     statement = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     input_format = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     output_format = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
-    memory_limit = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
-    time_limit = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
+    memory_limit = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    time_limit = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     difficulty = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    checker = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     created_at = sqlalchemy.Column(sqlalchemy.DateTime,
                                      default=datetime.datetime.now)
-    task_tests = orm.relationship("TaskTest", back_populates='tasks')
+    updated_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=True,
+                                   default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    task_tests = orm.relationship("TaskTest", back_populates='tasks', order_by="TaskTest.id")
     submissions = orm.relationship("Submissions", back_populates="tasks")
+    signature = orm.relationship("TaskSignature", back_populates="task", uselist=False,
+                                 cascade="all, delete-orphan")
     theme = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    external_id = sqlalchemy.Column(sqlalchemy.String, nullable=True, index=True, unique=True)
@@ -0,0 +1,21 @@
+import sqlalchemy
+from sqlalchemy import orm
+
+from .db_session import SqlAlchemyBase
+
+
+class TestResult(SqlAlchemyBase):
+    __tablename__ = 'test_results'
+
+    id = sqlalchemy.Column(sqlalchemy.Integer,
+                           primary_key=True, autoincrement=True)
+    submission_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                      sqlalchemy.ForeignKey("submissions.id"), index=True)
+    test_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                sqlalchemy.ForeignKey("task_tests.id"))
+    status = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    wall_time = sqlalchemy.Column(sqlalchemy.Float, nullable=True)
+    cpu_time = sqlalchemy.Column(sqlalchemy.Float, nullable=True)
+    max_memory = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
+    submission = orm.relationship("Submissions", back_populates="test_results")
+    test = orm.relationship("TaskTest")
@@ -0,0 +1,17 @@
+import sqlalchemy
+
+from .db_session import SqlAlchemyBase
+
+
+class ThemeStats(SqlAlchemyBase):
+    __tablename__ = 'theme_stats'
+    __table_args__ = (sqlalchemy.UniqueConstraint("subject", "theme"),)
+
+    id = sqlalchemy.Column(sqlalchemy.Integer,
+                           primary_key=True, autoincrement=True)
+    subject = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    theme = sqlalchemy.Column(sqlalchemy.Text)
+    total = sqlalchemy.Column(sqlalchemy.Integer, default=0)
+    ok = sqlalchemy.Column(sqlalchemy.Integer, default=0)
+    solve_time_sum = sqlalchemy.Column(sqlalchemy.Float, default=0)
+    solved_count = sqlalchemy.Column(sqlalchemy.Integer, default=0)
@@ -0,0 +1,31 @@
+import sqlalchemy
+from sqlalchemy import orm
+
+from .db_session import SqlAlchemyBase
+
+
+class UserTaskStats(SqlAlchemyBase):
+    __tablename__ = 'user_task_stats'
+    __table_args__ = (sqlalchemy.UniqueConstraint("user_id", "task_id"),)
+
+    id = sqlalchemy.Column(sqlalchemy.Integer,
+                           primary_key=True, autoincrement=True)
+    user_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                sqlalchemy.ForeignKey("users.id"))
+    task_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                sqlalchemy.ForeignKey("tasks.id"), index=True)
+    attempts = sqlalchemy.Column(sqlalchemy.Integer, default=0)
+    solved = sqlalchemy.Column(sqlalchemy.Boolean, default=False)
+    best_submission_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                           sqlalchemy.ForeignKey("submissions.id"), nullable=True)
+    best_total_tests = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
+    first_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=True)
+    first_ok_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=True)
+    last_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=True)
+    task = orm.relationship("Tasks")
+    user = orm.relationship("User")
+    best_submission = orm.relationship("Submissions")
+
+    @property
+    def subject(self):
+        return self.task.subject if self.task else None
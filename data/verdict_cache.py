@@ -0,0 +1,20 @@
+import datetime
+import sqlalchemy
+
+from .db_session import SqlAlchemyBase
+
+
+class VerdictCache(SqlAlchemyBase):
+    __tablename__ = 'verdict_cache'
+    __table_args__ = (sqlalchemy.UniqueConstraint("source_hash", "tests_hash"),)
+
+    id = sqlalchemy.Column(sqlalchemy.Integer,
+                           primary_key=True, autoincrement=True)
+    task_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                sqlalchemy.ForeignKey("tasks.id"), index=True)
+    source_hash = sqlalchemy.Column(sqlalchemy.String(64))
+    tests_hash = sqlalchemy.Column(sqlalchemy.String(64))
+    verdict = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    total_tests = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
+    created_at = sqlalchemy.Column(sqlalchemy.DateTime,
+                                   default=datetime.datetime.now)
@@ -0,0 +1,122 @@
+import hashlib
+import random
+import re
+
+from sqlalchemy import event
+
+from data.task_signature_bands import TaskSignatureBand
+from data.task_signatures import TaskSignature
+from data.tasks import Tasks
+
+SHINGLE_SIZE = 3
+PERMUTATIONS = 64
+BANDS = 16
+ROWS = PERMUTATIONS // BANDS
+THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(20240601)
+_COEFFICIENTS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for _ in range(PERMUTATIONS)]
+_WORD = re.compile(r"\w+")
+
+
+def words(*texts):
+    text = " ".join(t for t in texts if t).lower().replace("ё", "е")
+    return _WORD.findall(text)
+
+
+def shingles(tokens, size=SHINGLE_SIZE):
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def signature(title, statement):
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles(words(title, statement))]
+    if not hashes:
+        return None
+    return "".join(f"{min((a * h + b) % _PRIME for h in hashes) & 0xffffffff:08x}" for a, b in _COEFFICIENTS)
+
+
+def buckets(sig):
+    width = ROWS * 8
+    return [f"{band}:{hashlib.blake2b(sig[band * width:(band + 1) * width].encode(), digest_size=8).hexdigest()}"
+            for band in range(BANDS)]
+
+
+def similarity(first, second):
+    same = sum(1 for i in range(0, len(first), 8) if first[i:i + 8] == second[i:i + 8])
+    return same / PERMUTATIONS
+
+
+def attach(task):
+    sig = signature(task.title, task.statement)
+    if sig is None:
+        task.signature = None
+        return None
+    if task.signature is None:
+        task.signature = TaskSignature()
+    task.signature.subject = task.subject
+    task.signature.signature = sig
+    return task.signature
+
+
+def find_duplicate(db_sess, task, threshold=THRESHOLD):
+    return find_duplicates(db_sess, [task], threshold).get(task)
+
+
+def find_duplicates(db_sess, tasks, threshold=THRESHOLD):
+    own = {task: buckets(task.signature.signature) for task in tasks if task.signature is not None}
+    wanted = {bucket for task_buckets in own.values() for bucket in task_buckets}
+    index = {}
+    if wanted:
+        with db_sess.no_autoflush:
+            rows = db_sess.query(TaskSignatureBand.bucket, TaskSignature.task_id, TaskSignature.subject,
+                                 TaskSignature.signature).join(
+                TaskSignature, TaskSignature.task_id == TaskSignatureBand.task_id
+            ).filter(TaskSignatureBand.bucket.in_(wanted)).all()
+        for bucket, task_id, subject, sig in rows:
+            index.setdefault((subject, bucket), {})[task_id] = sig
+
+    found = {}
+    for task, task_buckets in own.items():
+        sig = task.signature.signature
+        best, best_score = None, threshold
+        for bucket in task_buckets:
+            for other, other_sig in index.get((task.subject, bucket), {}).items():
+                if other is task or other == task.id:
+                    continue
+                score = similarity(sig, other_sig)
+                if score >= best_score:
+                    best, best_score = other, score
+        if best is not None:
+            found[task] = best
+            continue
+        for bucket in task_buckets:
+            index.setdefault((task.subject, bucket), {})[task] = sig
+    with db_sess.no_autoflush:
+        for task, best in found.items():
+            if isinstance(best, int):
+                found[task] = db_sess.get(Tasks, best)
+    return found
+
+
+_bands = TaskSignatureBand.__table__
+
+
+@event.listens_for(TaskSignature, "after_insert")
+def _insert_bands(mapper, connection, target):
+    connection.execute(_bands.insert(), [{"task_id": target.task_id, "bucket": bucket}
+                                         for bucket in buckets(target.signature)])
+
+
+@event.listens_for(TaskSignature, "after_update")
+def _update_bands(mapper, connection, target):
+    _delete_bands(mapper, connection, target)
+    _insert_bands(mapper, connection, target)
+
+
+@event.listens_for(TaskSignature, "before_delete")
+def _delete_bands(mapper, connection, target):
+    connection.execute(_bands.delete().where(_bands.c.task_id == target.task_id))
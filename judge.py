@@ -0,0 +1,397 @@
+import datetime
+import hashlib
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.exc import IntegrityError
+
+import checker
+import sandbox
+import stats
+import storage
+from data import db_session
+from data.judge_jobs import JudgeJob
+from data.submissions import Submissions, PENDING_VERDICT
+from data.task_tests import TaskTest
+from data.test_results import TestResult
+from data.verdict_cache import VerdictCache
+
+TIMEOUT_VERDICT = "Превышено максимальное время работы"
+MEMORY_VERDICT = "Превышен лимит памяти"
+OUTPUT_VERDICT = "Превышен лимит вывода"
+SYSTEM_ERROR_VERDICT = "Ошибка тестирующей системы"
+
+UNCACHED_VERDICTS = (TIMEOUT_VERDICT, SYSTEM_ERROR_VERDICT, PENDING_VERDICT)
+
+DEFAULT_TIME_LIMIT = 1.0
+DEFAULT_MEMORY_LIMIT = 256 * 1024 ** 2
+CPU_LIMIT_CODES = (-signal.SIGXCPU, -signal.SIGKILL) if hasattr(signal, "SIGXCPU") else ()
+FSIZE_LIMIT_CODE = -signal.SIGXFSZ if hasattr(signal, "SIGXFSZ") else None
+
+_jobs = queue.Queue()
+_lock = threading.Lock()
+_workers = []
+_sandbox = None
+_booted = datetime.datetime.now()
+_config = {"workers": 4, "on_result": None, "test_workers": 4, "stop_on_fail": False, "sandbox_pool": 4,
+           "output_limit": 16 * 1024 ** 2}
+
+
+def init(workers=4, on_result=None, test_workers=4, stop_on_fail=False, sandbox_pool=4,
+         output_limit=16 * 1024 ** 2):
+    _config["workers"] = max(1, int(workers))
+    _config["on_result"] = on_result
+    _config["test_workers"] = max(1, int(test_workers))
+    _config["stop_on_fail"] = bool(stop_on_fail)
+    _config["sandbox_pool"] = max(0, int(sandbox_pool))
+    _config["output_limit"] = int(output_limit)
+
+
+def start():
+    global _sandbox
+    if _workers:
+        return
+    with _lock:
+        if _workers:
+            return
+        if _config["sandbox_pool"] and sandbox.available():
+            _sandbox = sandbox.SandboxPool(_config["sandbox_pool"])
+        db_sess = db_session.create_session()
+        try:
+            pending = _recover(db_sess, _booted)
+        finally:
+            db_sess.close()
+        for job_id in pending:
+            _jobs.put(job_id)
+        for i in range(_config["workers"]):
+            worker = threading.Thread(target=_worker, name=f"judge-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def _recover(db_sess, before):
+    # jobs left running by a previous process are retried; claims below only take pending ones
+    db_sess.query(JudgeJob).filter(JudgeJob.status == "running").update(
+        {JudgeJob.status: "pending"}, synchronize_session=False)
+    # a submission a previous process committed without a job (e.g. a crash before submit) would stay pending
+    # forever; ones from this process may be just about to be submitted
+    orphans = db_sess.query(Submissions).filter(
+        Submissions.verdict == PENDING_VERDICT,
+        Submissions.created_at < before,
+        ~db_sess.query(JudgeJob.id).filter(JudgeJob.submission_id == Submissions.id,
+                                           JudgeJob.status != "done").exists()
+    ).all()
+    for submission in orphans:
+        submission.verdict = SYSTEM_ERROR_VERDICT
+        submission.total_tests = 0
+        stats.record_submission(db_sess, submission)
+    db_sess.commit()
+    pending = db_sess.query(JudgeJob.id).filter(JudgeJob.status == "pending").order_by(JudgeJob.id)
+    return [job_id for (job_id,) in pending]
+
+
+def tests_version(task, tests):
+    sha = hashlib.sha256()
+    sha.update(f"{task.time_limit}|{task.memory_limit}|{task.checker}|{_config['output_limit']}|"
+               f"{_config['stop_on_fail']}".encode("utf-8"))
+    for test in tests:
+        for value in (test.input_hash, test.input_data, test.output_hash, test.output):
+            sha.update(hashlib.sha256((value or "").encode("utf-8")).digest())
+    return sha.hexdigest()
+
+
+def invalidate_task(db_sess, task_id):
+    db_sess.query(VerdictCache).filter(VerdictCache.task_id == task_id).delete()
+
+
+def submit(db_sess, submission, room=None):
+    tests = db_sess.query(TaskTest).filter(TaskTest.task_id == submission.task_id).order_by(TaskTest.id).all()
+    cached = db_sess.query(VerdictCache).filter(
+        VerdictCache.source_hash == submission.source_hash,
+        VerdictCache.tests_hash == tests_version(submission.tasks, tests)
+    ).first()
+    if cached is not None:
+        submission.verdict = cached.verdict
+        submission.total_tests = cached.total_tests
+        stats.record_submission(db_sess, submission)
+        db_sess.commit()
+        if _config["on_result"] is not None:
+            _config["on_result"](submission, room)
+        return None
+
+    start()
+    job = JudgeJob(
+        submission_id=submission.id,
+        room=room
+    )
+    db_sess.add(job)
+    db_sess.commit()
+    _jobs.put(job.id)
+    return job.id
+
+
+def parse_memory_limit(value):
+    if value is None:
+        return DEFAULT_MEMORY_LIMIT
+    match = re.match(r"\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Zа-яА-Я]*)", str(value))
+    if not match:
+        return DEFAULT_MEMORY_LIMIT
+    number = float(match.group(1).replace(",", "."))
+    unit = match.group(2).lower()
+    if unit in ("kb", "кб"):
+        return int(number * 1024)
+    if unit in ("gb", "гб"):
+        return int(number * 1024 ** 3)
+    return int(number * 1024 ** 2)
+
+
+def parse_time_limit(value):
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return DEFAULT_TIME_LIMIT
+
+
+def run_tests(source, task, tests, stop_on_fail=None):
+    if stop_on_fail is None:
+        stop_on_fail = _config["stop_on_fail"]
+    limits = {
+        "time_limit": parse_time_limit(task.time_limit),
+        "memory_limit": parse_memory_limit(task.memory_limit),
+        "output_limit": _config["output_limit"],
+        "checker": checker.parse(task.checker)
+    }
+    results = [None] * len(tests)
+    cancelled = threading.Event()
+    running = set()
+    running_lock = threading.Lock()
+
+    def run_one(i):
+        if cancelled.is_set():
+            return
+        results[i] = _run_test(source, limits, tests[i], cancelled, running, running_lock)
+        if stop_on_fail and results[i] is not None and results[i][0] != "OK":
+            cancelled.set()
+            with running_lock:
+                for cancel in running:
+                    cancel()
+
+    if tests:
+        with ThreadPoolExecutor(max_workers=min(_config["test_workers"], len(tests))) as pool:
+            list(pool.map(run_one, range(len(tests))))
+
+    test_passed = sum(1 for r in results if r is not None and r[0] == "OK")
+    verdict = None
+    for r in results:
+        if r is not None and r[0] not in ("OK", "WA"):
+            verdict = r[1]
+            break
+    if test_passed == len(tests):
+        verdict = "OK"
+    elif verdict is None:
+        verdict = "Частичное решение"
+    return verdict, test_passed, results
+
+
+def _run_test(source, limits, test, cancelled, running, running_lock):
+    if _sandbox is not None:
+        runner = _sandbox.acquire()
+        try:
+            result = _run_in(runner, source, limits, test, cancelled, running, running_lock)
+        finally:
+            _sandbox.release(runner)
+    elif sandbox.available():
+        # a one-off runner still streams output and measures the submission alone, unlike a plain subprocess
+        runner = sandbox.Runner()
+        try:
+            result = _run_in(runner, source, limits, test, cancelled, running, running_lock)
+        finally:
+            runner.kill()
+    else:
+        result = _run_cold(source, test, limits, running, running_lock)
+    if cancelled.is_set() and (result is None or result.returncode != 0):
+        return None
+    if result is None:
+        return "RE", SYSTEM_ERROR_VERDICT, None
+    last_error = result.stderr.splitlines()[-1] if result.stderr.strip() else ""
+    if result.timed_out:
+        return "TL", TIMEOUT_VERDICT, result
+    if result.output_exceeded or result.returncode == FSIZE_LIMIT_CODE:
+        return "OL", OUTPUT_VERDICT, result
+    if result.accepted is False and result.returncode == -signal.SIGKILL and not result.stderr:
+        return "WA", None, result
+    if result.returncode in CPU_LIMIT_CODES:
+        return "TL", TIMEOUT_VERDICT, result
+    if last_error.startswith("MemoryError") or (result.max_rss or 0) > limits["memory_limit"]:
+        return "ML", MEMORY_VERDICT, result
+    if result.stderr:
+        return "RE", last_error or result.stderr, result
+    if result.accepted:
+        return "OK", None, result
+    return "WA", None, result
+
+
+def _run_in(runner, source, limits, test, cancelled, running, running_lock):
+    with running_lock:
+        running.add(runner.cancel)
+    try:
+        if cancelled.is_set():
+            return None
+        return runner.execute(source, test.input_data, limits["time_limit"], limits["memory_limit"],
+                              limits["output_limit"], stdin_path=test.input_path(),
+                              checker_spec=_checker_spec(limits["checker"], test))
+    finally:
+        with running_lock:
+            running.discard(runner.cancel)
+
+
+def _checker_spec(spec, test):
+    spec = dict(spec, expected=test.output, expected_path=test.output_path())
+    if spec["mode"] == "custom":
+        spec["checker_path"] = storage.path(spec["checker_hash"])
+        spec["input"] = test.input_data
+        spec["input_path"] = test.input_path()
+    return spec
+
+
+def _run_cold(source, test, limits, running, running_lock):
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "submission.py"), "w", encoding="utf-8") as f:
+            f.write(source)
+        return _run_cold_in(workdir, test, limits, running, running_lock)
+
+
+def _run_cold_in(workdir, test, limits, running, running_lock):
+    # only used without fork (Windows): no resource limits, and output is checked after the run
+    started = time.monotonic()
+    p = subprocess.Popen(
+        [sys.executable, "submission.py"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=workdir
+    )
+    with running_lock:
+        running.add(p.kill)
+    timed_out = False
+    try:
+        out, err = p.communicate(test.get_input(), timeout=limits["time_limit"])
+    except subprocess.TimeoutExpired:
+        p.kill()
+        out, err = p.communicate()
+        timed_out = True
+    finally:
+        with running_lock:
+            running.discard(p.kill)
+    wall_time = time.monotonic() - started
+    output_exceeded = len(out.encode("utf-8")) > limits["output_limit"]
+    output_checker = checker.create(_checker_spec(limits["checker"], test))
+    try:
+        accepted = output_checker.feed(out.encode("utf-8")) and output_checker.finish()
+    finally:
+        output_checker.close()
+    return sandbox.RunResult(out, err, p.returncode, timed_out, wall_time, None, None,
+                             output_exceeded, accepted)
+
+
+def _remember(db_sess, submission, version):
+    db_sess.add(VerdictCache(
+        task_id=submission.task_id,
+        source_hash=submission.source_hash,
+        tests_hash=version,
+        verdict=submission.verdict,
+        total_tests=submission.total_tests
+    ))
+    try:
+        db_sess.commit()
+    except IntegrityError:
+        db_sess.rollback()
+
+
+def _worker():
+    while True:
+        job_id = _jobs.get()
+        try:
+            _judge(job_id)
+        except Exception as e:
+            print(f"Ошибка проверки задания {job_id}: {e}")
+            _fail(job_id)
+        finally:
+            _jobs.task_done()
+
+
+def _fail(job_id):
+    db_sess = db_session.create_session()
+    try:
+        job = db_sess.get(JudgeJob, job_id)
+        if job is None:
+            return
+        job.status = "done"
+        submission = db_sess.get(Submissions, job.submission_id)
+        if submission is None or submission.verdict != PENDING_VERDICT:
+            db_sess.commit()
+            return
+        submission.verdict = SYSTEM_ERROR_VERDICT
+        submission.total_tests = 0
+        stats.record_submission(db_sess, submission)
+        db_sess.commit()
+        if _config["on_result"] is not None:
+            _config["on_result"](submission, job.room)
+    except Exception as e:
+        print(f"Ошибка проверки задания {job_id}: {e}")
+    finally:
+        db_sess.close()
+
+
+def _judge(job_id):
+    db_sess = db_session.create_session()
+    try:
+        claimed = db_sess.query(JudgeJob).filter(
+            JudgeJob.id == job_id,
+            JudgeJob.status == "pending"
+        ).update({JudgeJob.status: "running"}, synchronize_session=False)
+        db_sess.commit()
+        if not claimed:
+            return
+        job = db_sess.get(JudgeJob, job_id)
+
+        submission = db_sess.get(Submissions, job.submission_id)
+        if submission is None:
+            job.status = "done"
+            db_sess.commit()
+            return
+        task = submission.tasks
+        tests = db_sess.query(TaskTest).filter(TaskTest.task_id == task.id).order_by(TaskTest.id).all()
+        source = storage.read_text(submission.source_hash)
+        submission.verdict, submission.total_tests, results = run_tests(source, task, tests)
+        for test, result in zip(tests, results):
+            if result is None:
+                continue
+            status, _, run = result
+            db_sess.add(TestResult(
+                submission_id=submission.id,
+                test_id=test.id,
+                status=status,
+                wall_time=run.wall_time if run else None,
+                cpu_time=run.cpu_time if run else None,
+                max_memory=run.max_rss if run else None
+            ))
+        job.status = "done"
+        stats.record_submission(db_sess, submission)
+        db_sess.commit()
+        if submission.verdict not in UNCACHED_VERDICTS:
+            _remember(db_sess, submission, tests_version(task, tests))
+
+        if _config["on_result"] is not None:
+            _config["on_result"](submission, job.room)
+    finally:
+        db_sess.close()
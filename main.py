@@ -1,27 +1,57 @@
-import csv
-import io
+import click
+import datetime
 
-from flask import Flask, render_template, redirect, request, abort, session, Response
-from data import db_session
+from flask import Flask, render_template, redirect, request, abort, session, Response, stream_with_context
+from markupsafe import Markup
+from data import db_session, migrations, queries
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from data.users import User
 from data.tasks import Tasks
 from data.submissions import Submissions
 from data.task_tests import TaskTest
+from data.user_task_stats import UserTaskStats
+from data.theme_stats import ThemeStats
+from data.analytics_rollups import AnalyticsRollup
 from forms.user import RegisterForm, LoginForm
 from flask_socketio import SocketIO, join_room, leave_room, emit
+from sqlalchemy import func, case
 from elo import update_elo
-from ai import generate_task
+from ai import generate_batch
+from checker import validate_spec
 import uuid
 import os
-import subprocess
+import dedup
+import judge
+import page_cache
+import query_plans
+import stats
+import storage
+import task_export
+import task_import
+import task_pool
+import task_service
+import user_cache
 
 from functools import wraps
-from collections import defaultdict
-from datetime import datetime
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = '65432456uijhgfdsxcvbn'
+app.config['JUDGE_WORKERS'] = int(os.environ.get('JUDGE_WORKERS', os.cpu_count() or 4))
+app.config['JUDGE_TEST_WORKERS'] = int(os.environ.get('JUDGE_TEST_WORKERS', os.cpu_count() or 4))
+app.config['JUDGE_STOP_ON_FAIL'] = os.environ.get('JUDGE_STOP_ON_FAIL', '0') == '1'
+app.config['JUDGE_SANDBOX_POOL'] = int(os.environ.get('JUDGE_SANDBOX_POOL', os.cpu_count() or 4))
+app.config['JUDGE_OUTPUT_LIMIT'] = int(os.environ.get('JUDGE_OUTPUT_LIMIT', 16 * 1024 * 1024))
+app.config['DATABASE_URL'] = os.environ.get('DATABASE_URL', 'db/task.db')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+app.config['DB_BUSY_TIMEOUT'] = int(os.environ.get('DB_BUSY_TIMEOUT', 10000))
+app.config['DB_MMAP_SIZE'] = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', user_cache.DEFAULT_TTL))
+app.config['QUERY_PLAN_AUDIT'] = os.environ.get('QUERY_PLAN_AUDIT', '0') == '1'
+app.config['ANALYTICS_ROLLUP_INTERVAL'] = int(os.environ.get('ANALYTICS_ROLLUP_INTERVAL', 60))
+app.config['AI_POOL_SIZE'] = int(os.environ.get('AI_POOL_SIZE', 3))
+app.config['AI_POOL_DIFFICULTIES'] = os.environ.get('AI_POOL_DIFFICULTIES', 'средняя').split(',')
+app.config['AI_POOL_INTERVAL'] = int(os.environ.get('AI_POOL_INTERVAL', 60))
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -44,11 +74,46 @@ def unauthorized(e):
 
 @login_manager.user_loader
 def load_user(user_id):
-    db_sess = db_session.create_session()
-    return db_sess.get(User, user_id)
+    return user_cache.get(user_id, lambda uid: db_session.get_session().get(User, uid))
 
 
-db_session.global_init("db/task.db")
+db_session.global_init(app.config['DATABASE_URL'],
+                       pragmas={'busy_timeout': app.config['DB_BUSY_TIMEOUT'],
+                                'mmap_size': app.config['DB_MMAP_SIZE']},
+                       pool_size=app.config['DB_POOL_SIZE'],
+                       max_overflow=app.config['DB_MAX_OVERFLOW'])
+storage.init(os.environ.get('STORAGE_DIR', 'storage'))
+query_plans.init(app, app.config['QUERY_PLAN_AUDIT'])
+user_cache.init(app.config['USER_CACHE_TTL'])
+task_pool.init([(subject, difficulty.strip()) for subject in subjects
+                for difficulty in app.config['AI_POOL_DIFFICULTIES'] if difficulty.strip()],
+               app.config['AI_POOL_SIZE'], app.config['AI_POOL_INTERVAL'])
+
+
+@app.before_request
+def open_db_scope():
+    db_session.open_scope()
+
+
+@app.before_request
+def start_background():
+    judge.start()
+    stats.start_rollups(app.config['ANALYTICS_ROLLUP_INTERVAL'])
+    task_pool.start()
+
+
+@app.teardown_appcontext
+def close_db_scope(exc):
+    db_session.close_scope()
+
+
+def db_scoped(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_session.scope():
+            return func(*args, **kwargs)
+
+    return wrapper
 
 
 def admin_required(func):
@@ -86,6 +151,14 @@ def subject(subject='subject'):
     return render_template('subject.html', subject=subject)
 
 
+def task_statuses(db_sess, user_id):
+    rows = db_sess.query(
+        Submissions.task_id,
+        func.max(case((Submissions.verdict == "OK", 1), else_=0))
+    ).filter(Submissions.user_id == user_id).group_by(Submissions.task_id).all()
+    return {task_id: "solved" if solved else "attempted" for task_id, solved in rows}
+
+
 @app.route("/<subject>/")
 @login_required
 @user_ban
@@ -95,31 +168,41 @@ def index(subject=None):
     session['subject'] = subject
     if request.path == '/' or 'subject' in request.path:
         return redirect('/subject/choice')
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     sort_by = request.args.get('sort_by')
+    stamp = page_cache.subject_stamp(db_sess, subject)
+    difficulties, themes = page_cache.fragment(("filters", subject), stamp, lambda: subject_filters(db_sess, subject))
+    selected_difficulties = request.args.getlist('difficulty')
+    selected_themes = request.args.getlist('theme')
+    statuses = task_statuses(db_sess, current_user.id)
+
+    def render():
+        query = db_sess.query(Tasks).filter(Tasks.subject == subject)
+        if selected_difficulties:
+            query = query.filter(Tasks.difficulty.in_(selected_difficulties))
+        if selected_themes:
+            query = query.filter(Tasks.theme.in_(selected_themes))
+        if sort_by == 'difficulty':
+            tasks = query.order_by(Tasks.difficulty).all()
+        elif sort_by == 'theme':
+            tasks = query.all()
+        else:
+            tasks = query.all()
+        return render_template('tasks.html', tasks=tasks, subject=subject,
+                               difficulties=difficulties, themes=themes, selected_difficulties=selected_difficulties,
+                               selected_themes=selected_themes, sort_by=sort_by, statuses=statuses)
+
+    parts = (current_user.id, current_user.name, current_user.admin, subject, stamp,
+             sorted(request.args.items(multi=True)), sorted(statuses.items()))
+    return page_cache.conditional(parts, None, render)
 
+
+def subject_filters(db_sess, subject):
     difficulties = db_sess.query(Tasks.difficulty).filter(Tasks.subject == subject).distinct().all()
     difficulties = [d[0] for d in difficulties if d[0]]
     themes = db_sess.query(Tasks.theme).filter(Tasks.subject == subject).distinct().all()
     themes = [t[0] for t in themes if t[0]]
-    selected_difficulties = request.args.getlist('difficulty')
-    selected_themes = request.args.getlist('theme')
-
-    query = db_sess.query(Tasks).filter(Tasks.subject == subject)
-    if selected_difficulties:
-        query = query.filter(Tasks.difficulty.in_(selected_difficulties))
-    if selected_themes:
-        query = query.filter(Tasks.theme.in_(selected_themes))
-    if sort_by == 'difficulty':
-        tasks = query.order_by(Tasks.difficulty).all()
-    elif sort_by == 'theme':
-        tasks = query.all()
-    else:
-        tasks = query.all()
-    submissions = db_sess.query(Submissions)
-    return render_template('tasks.html', tasks=tasks, subject=subject,
-                           difficulties=difficulties, themes=themes, selected_difficulties=selected_difficulties,
-                           selected_themes=selected_themes, sort_by=sort_by, Submissions=Submissions, submissions=submissions)
+    return difficulties, themes
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -130,7 +213,7 @@ def reqister():
             return render_template('register.html', title='Регистрация',
                                    form=form,
                                    message="Пароли не совпадают")
-        db_sess = db_session.create_session()
+        db_sess = db_session.get_session()
         if db_sess.query(User).filter(User.email == form.email.data).first():
             return render_template('register.html', title='Регистрация',
                                    form=form,
@@ -150,7 +233,7 @@ def reqister():
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        db_sess = db_session.create_session()
+        db_sess = db_session.get_session()
         user = db_sess.query(User).filter(User.email == form.email.data).first()
         if user and user.check_password(form.password.data) and user.ban != 1:
             login_user(user, remember=form.remember_me.data)
@@ -175,40 +258,18 @@ def logout():
 @user_ban
 def profile(user_id=None):
     subject = session.get('subject')
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     if user_id is None:
-        user = current_user
+        user = db_sess.get(User, current_user.id)
     else:
         user = db_sess.get(User, user_id)
         if not user:
             abort(404)
 
-    all_submissions = db_sess.query(Submissions).filter(
-        Submissions.user_id == user.id
-    ).order_by(Submissions.created_at.desc()).all()
-    tasks_stats = {}
-    for submission in all_submissions:
-        task_id = submission.task_id
-        task_task = db_sess.get(Tasks, task_id)
-        if task_id not in tasks_stats:
-            tasks_stats[task_id] = {
-                'task': submission.tasks,
-                'best_submission': submission,
-                'attempts': 1,
-                'solved': submission.verdict == "OK",
-                'subject': task_task.subject
-            }
-        else:
-            tasks_stats[task_id]['attempts'] += 1
-            if task_task.subject == 'информатика':
-                if submission.total_tests > tasks_stats[task_id]['best_submission'].total_tests:
-                    tasks_stats[task_id]['best_submission'] = submission
-            if submission.verdict == "OK":
-                tasks_stats[task_id]['solved'] = True
-    tasks_stats = tasks_stats.values()
+    tasks_stats = queries.user_task_stats(db_sess, user.id).order_by(UserTaskStats.last_at.desc()).all()
     total_tasks_attempted = len(tasks_stats)
-    solved_tasks = sum(1 for t in tasks_stats if t['solved'])
-    total_submissions = len(all_submissions)
+    solved_tasks = sum(1 for t in tasks_stats if t.solved)
+    total_submissions = sum(t.attempts for t in tasks_stats)
 
     return render_template(
         'profile.html',
@@ -228,9 +289,9 @@ def profile(user_id=None):
 @user_ban
 def edit_profile(user_id=None):
     subject = session.get('subject')
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     if user_id is None:
-        user = current_user
+        user = db_sess.get(User, current_user.id)
     else:
         user = db_sess.get(User, user_id)
         if not user:
@@ -259,6 +320,7 @@ def edit_profile(user_id=None):
             user.name = name
             user.email = email
             db_sess.commit()
+            user_cache.invalidate(user.id)
             return redirect(f"/profile/{user.id}")
 
     return render_template(
@@ -269,70 +331,102 @@ def edit_profile(user_id=None):
     )
 
 
+def parse_day(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
 @app.route('/analytics')
 @login_required
 @user_ban
 def analytics():
     subject = session.get('subject')
-    db_sess = db_session.create_session()
-    submissions = db_sess.query(Submissions).join(Tasks).all()
-
-    total_submissions = len(submissions)
-    ok_submissions = sum(1 for s in submissions if s.verdict == "OK")
+    selected_subject = request.args.get('subject') or (subject if subject in subjects else 'all')
+    date_from = parse_day(request.args.get('from'))
+    date_to = parse_day(request.args.get('to'))
+    db_sess = db_session.get_session()
+
+    if date_from or date_to:
+        period_end = (date_to or datetime.datetime.now()) + datetime.timedelta(days=1)
+        period_start = date_from or period_end - datetime.timedelta(days=30)
+    else:
+        period_end = datetime.datetime.now() + datetime.timedelta(days=1)
+        period_start = period_end - datetime.timedelta(days=30)
+    period = "hour" if period_end - period_start <= datetime.timedelta(days=2) else "day"
+    rollups = db_sess.query(AnalyticsRollup).filter(
+        AnalyticsRollup.period == period,
+        AnalyticsRollup.bucket >= stats.bucket_start(period_start, period),
+        AnalyticsRollup.bucket < period_end
+    )
+    theme_stats = db_sess.query(ThemeStats)
+    if selected_subject != 'all':
+        rollups = rollups.filter(AnalyticsRollup.subject == selected_subject)
+        theme_stats = theme_stats.filter(ThemeStats.subject == selected_subject)
+
+    trend = rollups.with_entities(
+        AnalyticsRollup.bucket,
+        func.sum(AnalyticsRollup.total),
+        func.sum(AnalyticsRollup.ok)
+    ).group_by(AnalyticsRollup.bucket).order_by(AnalyticsRollup.bucket).all()
+    if date_from or date_to:
+        source, model = rollups, AnalyticsRollup
+    else:
+        source, model = theme_stats, ThemeStats
+    theme_stats = source.with_entities(
+        model.theme,
+        func.sum(model.total),
+        func.sum(model.ok),
+        func.sum(model.solve_time_sum),
+        func.sum(model.solved_count)
+    ).group_by(model.theme).order_by(model.theme).all()
+
+    total_submissions = sum(row[1] or 0 for row in theme_stats)
+    ok_submissions = sum(row[2] or 0 for row in theme_stats)
     accuracy = (ok_submissions / total_submissions * 100) if total_submissions else 0
-
-    task_attempts = defaultdict(list)
-    theme_stats = {}
-    solve_times = []
-
-    for s in submissions:
-        task_attempts[(s.user_id, s.task_id)].append(s)
-
-    for (user_id, task_id), subs in task_attempts.items():
-        subs_sorted = sorted(subs, key=lambda x: x.created_at or datetime.min)
-        first_time = subs_sorted[0].created_at
-        ok_time = None
-        for s in subs_sorted:
-            if s.verdict == "OK":
-                ok_time = s.created_at
-                break
-        if first_time and ok_time and ok_time >= first_time:
-            solve_times.append((ok_time - first_time).total_seconds())
-
-        task = subs_sorted[0].tasks
-        theme = task.theme if task and task.theme else "Без темы"
-        if theme not in theme_stats:
-            theme_stats[theme] = {"total": 0, "ok": 0, "solve_times": []}
-        theme_stats[theme]["total"] += len(subs_sorted)
-        theme_stats[theme]["ok"] += sum(1 for s in subs_sorted if s.verdict == "OK")
-        if first_time and ok_time and ok_time >= first_time:
-            theme_stats[theme]["solve_times"].append((ok_time - first_time).total_seconds())
-
-    avg_solve_time = sum(solve_times) / len(solve_times) if solve_times else None
+    solve_time_sum = sum(row[3] or 0 for row in theme_stats)
+    solved_count = sum(row[4] or 0 for row in theme_stats)
+    avg_solve_time = solve_time_sum / solved_count if solved_count else None
 
     theme_rows = []
-    max_theme_total = max((v["total"] for v in theme_stats.values()), default=0)
-    for theme, data in sorted(theme_stats.items(), key=lambda x: x[0]):
-        theme_accuracy = (data["ok"] / data["total"] * 100) if data["total"] else 0
-        theme_avg_time = (sum(data["solve_times"]) / len(data["solve_times"])
-                          if data["solve_times"] else None)
+    max_theme_total = max((row[1] or 0 for row in theme_stats), default=0)
+    for theme, total, ok, theme_time_sum, theme_solved in theme_stats:
+        if not total:
+            continue
         theme_rows.append({
             "theme": theme,
-            "total": data["total"],
-            "ok": data["ok"],
-            "accuracy": theme_accuracy,
-            "avg_time": theme_avg_time,
-            "bar": (data["total"] / max_theme_total * 100) if max_theme_total else 0
+            "total": total,
+            "ok": ok,
+            "accuracy": ok / total * 100,
+            "avg_time": theme_time_sum / theme_solved if theme_solved else None,
+            "bar": (total / max_theme_total * 100) if max_theme_total else 0
+        })
+
+    trend_rows = []
+    max_trend_total = max((row[1] or 0 for row in trend), default=0)
+    for bucket, total, ok in trend:
+        trend_rows.append({
+            "bucket": bucket.strftime("%d.%m.%Y %H:00" if period == "hour" else "%d.%m.%Y"),
+            "total": total,
+            "ok": ok,
+            "accuracy": ok / total * 100 if total else 0,
+            "bar": (total / max_trend_total * 100) if max_trend_total else 0
         })
 
     return render_template(
         "analytics.html",
         subject=subject,
+        subjects=subjects,
+        selected_subject=selected_subject,
+        date_from=request.args.get('from', ''),
+        date_to=request.args.get('to', ''),
         total_submissions=total_submissions,
         ok_submissions=ok_submissions,
         accuracy=accuracy,
         avg_solve_time=avg_solve_time,
-        theme_rows=theme_rows
+        theme_rows=theme_rows,
+        trend_rows=trend_rows
     )
 
 
@@ -342,7 +436,7 @@ def analytics():
 @user_ban
 def admin():
     subject = session.get('subject')
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     users = db_sess.query(User)
     if request.method == "POST":
         for user in users:
@@ -357,6 +451,7 @@ def admin():
             if ban_value == "unbanned":
                 user.ban = 0
         db_sess.commit()
+        user_cache.clear()
         return redirect('/admin')
     return render_template("admin_first.html", users=users, subject=subject)
 
@@ -367,7 +462,7 @@ def admin():
 @user_ban
 def admin_competitions():
     subject = session.get('subject')
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     message = None
     error = None
 
@@ -422,7 +517,7 @@ def admin_competitions():
 @user_ban
 def admin_results():
     subject = session.get('subject')
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     message = None
 
     if request.method == "POST":
@@ -432,7 +527,7 @@ def admin_results():
             if submission_id and submission_id.isdigit():
                 submission = db_sess.get(Submissions, int(submission_id))
                 if submission:
-                    db_sess.delete(submission)
+                    stats.remove_submission(db_sess, submission)
                     db_sess.commit()
                     message = "Результат удален"
 
@@ -441,7 +536,7 @@ def admin_results():
     verdict = request.args.get("verdict", "").strip()
     limit_raw = request.args.get("limit", "").strip()
 
-    query = db_sess.query(Submissions).order_by(Submissions.created_at.desc())
+    query = queries.submissions_with_details(db_sess).order_by(Submissions.created_at.desc())
     if user_id.isdigit():
         query = query.filter(Submissions.user_id == int(user_id))
     if task_id.isdigit():
@@ -467,6 +562,18 @@ def admin_results():
     )
 
 
+@app.route('/admin/query_plans', methods=["GET", "POST"])
+@login_required
+@admin_required
+@user_ban
+def admin_query_plans():
+    if request.method == "POST":
+        query_plans.reset()
+        return redirect('/admin/query_plans')
+    return render_template("admin_query_plans.html", plans=query_plans.report(),
+                           enabled=app.config['QUERY_PLAN_AUDIT'], subject=session.get('subject'))
+
+
 @app.route('/admin/task', methods=["GET", "POST"])
 @login_required
 @admin_required
@@ -476,6 +583,19 @@ def subject_admin():
     return render_template("subject_admin.html", subject=subject)
 
 
+def read_checker():
+    upload = request.files.get("checker_file")
+    if upload and upload.filename:
+        data = upload.read()
+        try:
+            compile(data, upload.filename, "exec")
+        except (SyntaxError, ValueError) as e:
+            return None, f"Ошибка в файле чекера: {e}"
+        return f"custom:{storage.put(data)}", None
+    checker = (request.form.get("checker") or "").strip() or None
+    return checker, validate_spec(checker)
+
+
 @app.route('/admin/task/<subject_admin>', methods=["GET", "POST"])
 @login_required
 @admin_required
@@ -484,10 +604,11 @@ def admin_task(subject_admin):
     subject = session['subject']
     if subject_admin == 'информатика':
         if request.method == "POST":
-            db_sess = db_session.create_session()
+            db_sess = db_session.get_session()
             task_name = request.form.get("task_name")
             memory_limit = request.form.get("memory_limit")
             time_limit = request.form.get("time_limit")
+            checker, message = read_checker()
             task_description = request.form.get("task_description")
             input_data = request.form.get("input_data")
             output_data = request.form.get("output_data")
@@ -499,6 +620,9 @@ def admin_task(subject_admin):
             test_list.append((request.form.get("test3_input"), request.form.get("test3_output")))
             test_list.append((request.form.get("test4_input"), request.form.get("test4_output")))
             test_list.append((request.form.get("test5_input"), request.form.get("test5_output")))
+            if message:
+                return render_template("admin_task.html", subject_admin=subject_admin, subject=subject,
+                                       message=message)
             task = Tasks(
                 subject=subject_admin,
                 title=task_name,
@@ -507,22 +631,14 @@ def admin_task(subject_admin):
                 output_format=output_data,
                 memory_limit=memory_limit,
                 time_limit=time_limit,
+                checker=checker,
                 difficulty=level,
                 theme=theme
             )
-            task_id = db_sess.query(Tasks).all()[-1].id + 1
-            for i in range(5):
-                task_test = TaskTest(
-                    task_id=task_id,
-                    input_data=test_list[i][0],
-                    output=test_list[i][1],
-                )
-                db_sess.add(task_test)
-            db_sess.add(task)
-            db_sess.commit()
+            task_service.create_task(db_sess, task, test_list[:5])
     else:
         if request.method == "POST":
-            db_sess = db_session.create_session()
+            db_sess = db_session.get_session()
             task_name = request.form.get("task_name")
             task_description = request.form.get("task_description")
             level = request.form.get("level")
@@ -534,14 +650,7 @@ def admin_task(subject_admin):
                 difficulty=level,
                 theme=theme
             )
-            task_id = db_sess.query(Tasks).all()[-1].id + 1
-            task_test = TaskTest(
-                task_id=task_id,
-                input_data=request.form.get("test_input"),
-            )
-            db_sess.add(task_test)
-            db_sess.add(task)
-            db_sess.commit()
+            task_service.create_task(db_sess, task, [(request.form.get("test_input"), None)])
     return render_template("admin_task.html", subject_admin=subject_admin, subject=subject)
 
 
@@ -551,35 +660,17 @@ def admin_task(subject_admin):
 @user_ban
 def admin_task_list():
     subject = session['subject']
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     tasks = db_sess.query(Tasks).all()
+    report = None
     if request.method == "POST":
         file = request.files.get("file")
         if not file or file.filename == "":
             abort(400, "Файл не выбран")
-        file.filename = "task.csv"
-        os.makedirs(f"task", exist_ok=True)
-        file.save(os.path.join(f"task", file.filename))
-        with open('task/task.csv', 'r', encoding='utf-8') as f:
-            reader = csv.reader(f, delimiter=',')
-            h = next(reader)
-            for row in reader:
-                task = Tasks(
-                    subject=row[1],
-                    theme=row[2],
-                    difficulty=row[3],
-                    title=row[4],
-                    statement=row[5],
-                    input_format=row[6],
-                    output_format=row[7],
-                    time_limit=row[8],
-                    memory_limit=row[9]
-                )
-                db_sess.add(task)
-                db_sess.commit()
-        return redirect('/admin/task_list')
+        report = task_import.import_csv(db_sess, file.stream, subjects)
+        tasks = db_sess.query(Tasks).all()
 
-    return render_template("task_list.html", subject=subject, tasks=tasks)
+    return render_template("task_list.html", subject=subject, tasks=tasks, report=report)
 
 
 @app.route('/admin/task_ai/<subject_admin>', methods=["GET", "POST"])
@@ -601,9 +692,15 @@ def ai(subject_admin, difficulty):
     subject = session['subject']
     ai_subject = subject_admin
     ai_difficulty = difficulty
-    ai_task = generate_task(ai_difficulty, ai_subject)
-    while ai_task.get("error") is not None:
-        ai_task = generate_task(ai_difficulty, subject)
+    message = None
+    ai_task = {}
+    if request.method == "GET":
+        ai_task = task_pool.take(db_session.get_session(), ai_subject, ai_difficulty) or {}
+        if not ai_task:
+            if task_pool.refill(ai_subject, ai_difficulty):
+                message = "Готовых задач пока нет, пул пополняется. Обновите страницу через минуту"
+            else:
+                message = "Генерация задач недоступна, попробуйте позже"
     ai_theme = ai_task.get("тема")
     ai_task_name = ai_task.get("название задачи")
     ai_task_description = ai_task.get("условие задачи")
@@ -620,7 +717,7 @@ def ai(subject_admin, difficulty):
         ai_test.append((ai_task.get("ответ"), ""))
     if subject_admin == 'информатика':
         if request.method == "POST":
-            db_sess = db_session.create_session()
+            db_sess = db_session.get_session()
             task_name = request.form.get("task_name")
             memory_limit = request.form.get("memory_limit")
             time_limit = request.form.get("time_limit")
@@ -645,20 +742,11 @@ def ai(subject_admin, difficulty):
                 difficulty=ai_level,
                 theme=theme
             )
-            task_id = db_sess.query(Tasks).all()[-1].id + 1
-            for i in range(5):
-                task_test = TaskTest(
-                    task_id=task_id,
-                    input_data=test_list[i][0],
-                    output=test_list[i][1],
-                )
-                db_sess.add(task_test)
-            db_sess.add(task)
-            db_sess.commit()
+            task_service.create_task(db_sess, task, test_list[:5], reuse_duplicate=True)
             return redirect('/admin')
     else:
         if request.method == "POST":
-            db_sess = db_session.create_session()
+            db_sess = db_session.get_session()
             task_name = request.form.get("task_name")
             task_description = request.form.get("task_description")
             theme = request.form.get("theme")
@@ -669,20 +757,15 @@ def ai(subject_admin, difficulty):
                 difficulty=ai_level,
                 theme=theme
             )
-            task_id = db_sess.query(Tasks).all()[-1].id + 1
-            task_test = TaskTest(
-                task_id=task_id,
-                input_data=request.form.get("test_input"),
-            )
-            db_sess.add(task_test)
-            db_sess.add(task)
-            db_sess.commit()
+            task_service.create_task(db_sess, task, [(request.form.get("test_input"), None)],
+                                     reuse_duplicate=True)
             return redirect('/admin')
     return render_template("admin_task_ai.html", subject=subject, ai_task_name=ai_task_name,
                            ai_memory_limit=ai_memory_limit, ai_time_limit=ai_time_limit,
                            ai_task_description=ai_task_description, ai_input_data=ai_input_data,
                            ai_output_data=ai_output_data, ai_level=ai_level, ai_theme=ai_theme,
-                           ai_subject=ai_subject, ai_test=ai_test, subject_admin=subject_admin)
+                           ai_subject=ai_subject, ai_test=ai_test, subject_admin=subject_admin,
+                           message=message)
 
 
 
@@ -691,31 +774,18 @@ def ai(subject_admin, difficulty):
 @admin_required
 @user_ban
 def export():
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow(['ID', 'SUBJECT', 'THEME', 'DIFFICULTY', 'TITLE', 'STATEMENT', 'INPUT_FORMAT', 'OUTPUT_FORMAT', 'TIME_LIMIT', 'MEMORY_LIMIT'])
-
-    db_sess = db_session.create_session()
-    tasks = db_sess.query(Tasks).all()
-
-    for task in tasks:
-        writer.writerow([
-            task.id,
-            task.subject,
-            task.theme,
-            task.difficulty,
-            task.title,
-            task.statement,
-            task.input_format,
-            task.output_format,
-            task.time_limit,
-            task.memory_limit
-        ])
-
-    output.seek(0)
-
-    return Response(output, mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=task.csv'})
+    fmt = request.args.get('format', 'csv')
+    if fmt not in task_export.FORMATS:
+        abort(400, "Неизвестный формат экспорта")
+    include_tests = request.args.get('tests') == '1'
+    include_submissions = request.args.get('submissions') == '1'
+    if include_submissions:
+        fmt = 'zip'
+    mimetypes = {'csv': 'text/csv', 'csv.gz': 'application/gzip', 'zip': 'application/zip'}
+    filenames = {'csv': 'task.csv', 'csv.gz': 'task.csv.gz', 'zip': 'task.zip'}
+    return Response(stream_with_context(task_export.stream(fmt, include_tests, include_submissions)),
+                    mimetype=mimetypes[fmt],
+                    headers={'Content-Disposition': f'attachment;filename={filenames[fmt]}'})
 
 
 @app.route('/admin/task_delete', methods=["GET", "POST"])
@@ -724,10 +794,14 @@ def export():
 @admin_required
 @user_ban
 def admin_task_delete(task_id=1):
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     task = db_sess.get(Tasks, task_id)
+    judge.invalidate_task(db_sess, task_id)
+    stats.forget_task(db_sess, task_id)
     db_sess.delete(task)
     db_sess.commit()
+    page_cache.invalidate_task(task_id)
+    page_cache.invalidate_subject(task.subject)
     return redirect('/admin')
 
 
@@ -738,34 +812,37 @@ def admin_task_delete(task_id=1):
 @user_ban
 def admin_task_edit(task_id=1):
     subject = session['subject']
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     db_task = db_sess.query(Tasks).filter(Tasks.id == task_id).all()[0]
     db_subject = db_task.subject
     db_task_name = db_task.title
     db_memory_limit = db_task.memory_limit
     db_time_limit = db_task.time_limit
+    db_checker = db_task.checker
     db_task_description = db_task.statement
     db_input_data = db_task.input_format
     db_output_data = db_task.output_format
     db_level = db_task.difficulty
     db_theme = db_task.theme
-    db_test = db_sess.query(TaskTest).filter(TaskTest.task_id == task_id).all()
+    db_test = db_sess.query(TaskTest).filter(TaskTest.task_id == task_id).order_by(TaskTest.id).all()
     if db_task.subject == 'информатика':
         if request.method == "POST":
             task_name = request.form.get("task_name")
             memory_limit = request.form.get("memory_limit")
             time_limit = request.form.get("time_limit")
+            checker, message = read_checker()
             task_description = request.form.get("task_description")
             input_data = request.form.get("input_data")
             output_data = request.form.get("output_data")
             level = request.form.get("level")
             theme = request.form.get("theme")
-            test_list = []
-            test_list.append((request.form.get("test1_input"), request.form.get("test1_output")))
-            test_list.append((request.form.get("test2_input"), request.form.get("test2_output")))
-            test_list.append((request.form.get("test3_input"), request.form.get("test3_output")))
-            test_list.append((request.form.get("test4_input"), request.form.get("test4_output")))
-            test_list.append((request.form.get("test5_input"), request.form.get("test5_output")))
+            if message:
+                return render_template("task_edit.html", subject=subject, db_task_name=db_task_name,
+                                       db_memory_limit=db_memory_limit, db_time_limit=db_time_limit,
+                                       db_checker=request.form.get("checker"),
+                                       db_task_description=db_task_description, db_input_data=db_input_data,
+                                       db_output_data=db_output_data, db_level=db_level, db_theme=db_theme,
+                                       db_subject=db_subject, db_test=db_test, message=message)
             db_task.subject = db_subject
             db_task.title = task_name
             db_task.statement = task_description
@@ -773,17 +850,21 @@ def admin_task_edit(task_id=1):
             db_task.output_format = output_data
             db_task.memory_limit = memory_limit
             db_task.time_limit = time_limit
+            db_task.checker = checker
             db_task.difficulty = level
             db_task.theme = theme
-            for i in range(5):
-                db_test[i].task_id = task_id
-                db_test[i].input_data = test_list[i][0]
-                db_test[i].output = test_list[i][1]
-                db_sess.commit()
+            for i, test in enumerate(db_test, 1):
+                test.set_data(request.form.get(f"test{i}_input"), request.form.get(f"test{i}_output"))
+            db_task.updated_at = datetime.datetime.now()
+            dedup.attach(db_task)
+            judge.invalidate_task(db_sess, task_id)
+            db_sess.commit()
+            page_cache.invalidate_task(task_id)
+            page_cache.invalidate_subject(db_subject)
             return redirect('/admin')
     else:
         if request.method == "POST":
-            db_sess = db_session.create_session()
+            db_sess = db_session.get_session()
             task_name = request.form.get("task_name")
             task_description = request.form.get("task_description")
             level = request.form.get("level")
@@ -793,12 +874,18 @@ def admin_task_edit(task_id=1):
             db_task.statement = task_description
             db_task.difficulty = level
             db_task.theme = theme
-            db_test[0].task_id = task_id
+            if not db_test:
+                db_test.append(TaskTest())
+                db_task.task_tests.append(db_test[0])
             db_test[0].input_data = request.form.get("test_input")
+            db_task.updated_at = datetime.datetime.now()
+            dedup.attach(db_task)
             db_sess.commit()
+            page_cache.invalidate_task(task_id)
+            page_cache.invalidate_subject(db_subject)
             return redirect('/admin')
     return render_template("task_edit.html", subject=subject, db_task_name=db_task_name,
-                           db_memory_limit=db_memory_limit, db_time_limit=db_time_limit,
+                           db_memory_limit=db_memory_limit, db_time_limit=db_time_limit, db_checker=db_checker,
                            db_task_description=db_task_description, db_input_data=db_input_data,
                            db_output_data=db_output_data, db_level=db_level, db_theme=db_theme,
                            db_subject=db_subject, db_test=db_test)
@@ -808,80 +895,18 @@ def admin_task_edit(task_id=1):
 @login_required
 @user_ban
 def create_pvp(subject):
+    if subject not in subjects:
+        abort(404)
+    db_sess = db_session.get_session()
     ai_difficulty = "средняя"
-    ai_task = generate_task(ai_difficulty, subject)
-    while ai_task.get("error") is not None:
-        ai_task = generate_task(ai_difficulty, subject)
-    ai_theme = ai_task.get("тема")
-    ai_task_name = ai_task.get("название задачи")
-    ai_task_description = ai_task.get("условие задачи")
-    ai_level = ai_difficulty
-    ai_memory_limit = ai_task.get("лимит памяти")
-    ai_time_limit = ai_task.get("лимит времени")
-    ai_input_data = ai_task.get("входные данные")
-    ai_output_data = ai_task.get("выходные данные")
-    ai_test = []
-    if subject == 'информатика':
-        for i in range(1, 6):
-            ai_test.append((ai_task.get(f"входные данные тест {i}"), ai_task.get(f"выходные данные тест {i}")))
-    else:
-        ai_test.append((ai_task.get("ответ"), ""))
-    if subject == 'информатика':
-        db_sess = db_session.create_session()
-        task_name =  ai_task_name
-        memory_limit = ai_memory_limit
-        time_limit = ai_time_limit
-        task_description = ai_task_description
-        input_data = ai_input_data
-        output_data = ai_output_data
-        theme = ai_theme
-        test_list = []
-        test_list.append((ai_test[0][0], ai_test[0][1]))
-        test_list.append((ai_test[1][0], ai_test[1][1]))
-        test_list.append((ai_test[2][0], ai_test[2][1]))
-        test_list.append((ai_test[3][0], ai_test[3][1]))
-        test_list.append((ai_test[4][0], ai_test[4][1]))
-        task = Tasks(
-            subject=subject,
-            title=task_name,
-            statement=task_description,
-            input_format=input_data,
-            output_format=output_data,
-            memory_limit=memory_limit,
-            time_limit=time_limit,
-            difficulty=ai_level,
-            theme=theme
-        )
-        task_id = db_sess.query(Tasks).all()[-1].id + 1
-        for i in range(5):
-            task_test = TaskTest(
-                task_id=task_id,
-                input_data=test_list[i][0],
-                output=test_list[i][1],
-            )
-            db_sess.add(task_test)
-        db_sess.add(task)
-        db_sess.commit()
+    ai_task = task_pool.take(db_sess, subject, ai_difficulty)
+    if ai_task is not None:
+        task, tests = task_service.from_ai(subject, ai_difficulty, ai_task)
+        task_id = task_service.create_task(db_sess, task, tests, reuse_duplicate=True).id
     else:
-        db_sess = db_session.create_session()
-        task_name = ai_task_name
-        task_description = ai_task_description
-        theme = ai_theme
-        task = Tasks(
-            subject=subject,
-            title=task_name,
-            statement=task_description,
-            difficulty=ai_level,
-            theme=theme
-        )
-        task_id = db_sess.query(Tasks).all()[-1].id + 1
-        task_test = TaskTest(
-            task_id=task_id,
-            input_data=ai_test[0][0],
-        )
-        db_sess.add(task_test)
-        db_sess.add(task)
-        db_sess.commit()
+        task_id = db_sess.query(Tasks.id).filter(Tasks.subject == subject).order_by(func.random()).limit(1).scalar()
+    if task_id is None:
+        abort(503)
     room = str(uuid.uuid4())
     session['room'] = room
     matches[room] = {
@@ -930,86 +955,42 @@ def pvp_choose(subject):
 @login_required
 @user_ban
 def training(subject, task_id):
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     task = db_sess.get(Tasks, task_id)
-    task_test = db_sess.query(TaskTest).filter(TaskTest.task_id == task.id).all()
-    submission = db_sess.query(Submissions).filter(Submissions.task_id == task.id).all()
-    submission_id = len(submission) + 1
+    if task is None:
+        abort(404)
     if subject == 'информатика':
         if request.method == "POST":
             file = request.files.get("file")
             if not file or file.filename == "":
                 abort(400, "Файл не выбран")
-            file.filename = f"submission_{submission_id}.py"
-            os.makedirs(f"submissions_training/submissions_{current_user.id}/task_{task_id}", exist_ok=True)
-            file.save(os.path.join(f"submissions_training/submissions_{current_user.id}/task_{task_id}", file.filename))
-
-            # judge
-            test_passed = 0
-            f_err = 0
-            for test in task_test:
-                p = subprocess.Popen(
-                    ["python3", f"submission_{submission_id}.py"],
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    cwd=f"submissions_training/submissions_{current_user.id}/task_{task_id}"
-                )
-                try:
-                    out, err = p.communicate(test.input_data, timeout=task.time_limit)
-                    out = out.strip()
-                    if err:
-                        submission_result = Submissions(
-                            user_id=current_user.id,
-                            task_id=task_id,
-                            verdict=err.splitlines()[-1],
-                            total_tests=test_passed,
-                        )
-                        f_err = 1
-                    else:
-                        if out == test.output.strip():
-                            test_passed += 1
-                except subprocess.TimeoutExpired:
-                    print("Превышено максимальное время работы")
-                    submission_result = Submissions(
-                        user_id=current_user.id,
-                        task_id=task_id,
-                        verdict="Превышено максимальное время работы",
-                        total_tests=test_passed,
-                    )
-                    f_err = 1
-                    p.kill()
-            if test_passed == 5:
-                submission_result = Submissions(
-                    user_id=current_user.id,
-                    task_id=task_id,
-                    verdict="OK",
-                    total_tests=test_passed,
-                )
-            elif f_err == 0:
-                submission_result = Submissions(
-                    user_id=current_user.id,
-                    task_id=task_id,
-                    verdict="Частичное решение",
-                    total_tests=test_passed,
-                )
+            submission_result = Submissions(
+                user_id=current_user.id,
+                task_id=task_id,
+                verdict=judge.PENDING_VERDICT,
+                total_tests=0,
+                source_hash=storage.put_stream(file.stream),
+            )
             db_sess.add(submission_result)
             db_sess.commit()
+            judge.submit(db_sess, submission_result)
         last_submission = db_sess.query(Submissions).filter(Submissions.user_id == current_user.id,
-                                                            Submissions.task_id == task_id).all()
+                                                            Submissions.task_id == task_id).order_by(
+            Submissions.created_at.desc(), Submissions.id.desc()).first()
         if last_submission:
-            result = last_submission[-1]
+            result = last_submission
             verdict = result.verdict
             test_passed = result.total_tests
         else:
             verdict = "Нет сданных решений"
             test_passed = None
-        return render_template('training.html', task=task, test=task_test[0], verdict=verdict, test_passed=test_passed, subject=subject)
+        return task_page(task, last_submission, (verdict, test_passed), lambda: render_template(
+            'training.html', statement=task_statement(task, 'task_statement.html'), verdict=verdict,
+            test_passed=test_passed, subject=subject, task_id=task_id))
     else:
         if request.method == "POST":
             answer = request.form.get("answer").lower()
-            if task_test[0].input_data.lower() == answer:
+            if task.task_tests[0].input_data.lower() == answer:
                 submission_result = Submissions(
                     user_id=current_user.id,
                     task_id=task_id,
@@ -1022,28 +1003,54 @@ def training(subject, task_id):
                     verdict="Неверный ответ, попробуйте снова",
                 )
             db_sess.add(submission_result)
+            stats.record_submission(db_sess, submission_result)
             db_sess.commit()
         last_submission = db_sess.query(Submissions).filter(Submissions.user_id == current_user.id,
-                                                    Submissions.task_id == task_id).all()
+                                                    Submissions.task_id == task_id).order_by(
+            Submissions.created_at.desc(), Submissions.id.desc()).first()
         if last_submission:
-            result = last_submission[-1]
+            result = last_submission
             verdict = result.verdict
         else:
             verdict = "Нет сданных решений"
-        return render_template('training_other.html', task=task, verdict=verdict, subject=subject)
+        return task_page(task, last_submission, (verdict,), lambda: render_template(
+            'training_other.html', statement=task_statement(task, 'task_statement_other.html'), verdict=verdict,
+            subject=subject))
+
+
+def task_statement(task, template):
+    return page_cache.fragment(("statement", task.id), page_cache.task_stamp(task), lambda: Markup(render_template(
+        template, task=task, test=task.task_tests[0] if task.task_tests else None)))
+
+
+def task_page(task, last_submission, state, render):
+    if request.method != "GET":
+        return render()
+    stamp = page_cache.task_stamp(task)
+    last_modified = stamp
+    if last_submission is not None:
+        if last_submission.verdict == judge.PENDING_VERDICT:
+            last_modified = None
+        elif last_submission.created_at and (stamp is None or last_submission.created_at > stamp):
+            last_modified = last_submission.created_at
+    parts = (current_user.id, current_user.name, current_user.admin, request.path, stamp,
+             last_submission.id if last_submission else None) + state
+    return page_cache.conditional(parts, last_modified, render)
 
 
 @app.route('/<subject>/pvp/room/<room>', methods=["GET", "POST"])
 @login_required
 @user_ban
 def pvp_room(subject, room):
+    if room not in matches:
+        abort(404)
     matches[room]['ochko'] = 0
     task_id = matches[room]['task_id']
-    db_sess = db_session.create_session()
-    task = db_sess.get(Tasks, task_id)
-    task_test = db_sess.query(TaskTest).filter(TaskTest.task_id == task.id).all()
-    submission = db_sess.query(Submissions).filter(Submissions.task_id == task.id).all()
-    submission_id = len(submission) + 1
+    db_sess = db_session.get_session()
+    task = queries.task_with_tests(db_sess, task_id)
+    if task is None:
+        abort(404)
+    task_test = task.task_tests
     if subject == 'информатика':
         if request.method == "POST":
             if len(matches[room]['players']) <= 1:
@@ -1053,72 +1060,16 @@ def pvp_room(subject, room):
             file = request.files.get("file")
             if not file or file.filename == "":
                 abort(400, "Файл не выбран")
-            file.filename = f"submission_{submission_id}.py"
-            os.makedirs(f"submissions_pvp/submissions_{current_user.id}/task_{task_id}", exist_ok=True)
-            file.save(os.path.join(f"submissions_pvp/submissions_{current_user.id}/task_{task_id}", file.filename))
-
-            # judge
-            test_passed = 0
-            f_err = 0
-            for test in task_test:
-                p = subprocess.Popen(
-                    ["python3", f"submission_{submission_id}.py"],
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    cwd=f"submissions_pvp/submissions_{current_user.id}/task_{task_id}"
-                )
-                try:
-                    out, err = p.communicate(test.input_data, timeout=task.time_limit)
-                    out = out.strip()
-                    if err:
-                        print(err)
-                        submission_result = Submissions(
-                            user_id=current_user.id,
-                            task_id=task_id,
-                            verdict=err.splitlines()[-1],
-                            total_tests=test_passed,
-                        )
-                        f_err = 1
-                    else:
-                        if out == test.output.strip():
-                            test_passed += 1
-                except subprocess.TimeoutExpired:
-                    print("Превышено максимальное время работы")
-                    submission_result = Submissions(
-                        user_id=current_user.id,
-                        task_id=task_id,
-                        verdict="Превышено максимальное время работы",
-                        total_tests=test_passed,
-                    )
-                    f_err = 1
-                    p.kill()
-            if test_passed == 5:
-                submission_result = Submissions(
-                    user_id=current_user.id,
-                    task_id=task_id,
-                    verdict="OK",
-                    total_tests=test_passed,
-                )
-                matches[room]['ochko'] = 1
-            elif f_err == 0:
-                submission_result = Submissions(
-                    user_id=current_user.id,
-                    task_id=task_id,
-                    verdict="Частичное решение",
-                    total_tests=test_passed,
-                )
+            submission_result = Submissions(
+                user_id=current_user.id,
+                task_id=task_id,
+                verdict=judge.PENDING_VERDICT,
+                total_tests=0,
+                source_hash=storage.put_stream(file.stream),
+            )
             db_sess.add(submission_result)
             db_sess.commit()
-
-            uid = str(current_user.id)
-            matches[room]['completed'][uid] = matches[room]['ochko']
-            if matches[room]['ochko'] == 1:
-                result = finish_match(room)
-                socketio.emit('match_finished', {'result': result}, room=room)
-
-                return redirect(f"/{subject}/pvp/results/{room}")
+            judge.submit(db_sess, submission_result, room=room)
 
         players_info = []
         for uid_str in matches[room]['players']:
@@ -1126,9 +1077,10 @@ def pvp_room(subject, room):
             players_info.append({'name': user.name, 'elo': user.elo_rating})
 
         last_submission = db_sess.query(Submissions).filter(Submissions.user_id == current_user.id,
-                                                            Submissions.task_id == task_id).all()
+                                                            Submissions.task_id == task_id).order_by(
+            Submissions.created_at.desc(), Submissions.id.desc()).first()
         if last_submission:
-            result = last_submission[-1]
+            result = last_submission
             verdict = result.verdict
             test_passed = result.total_tests
         else:
@@ -1156,6 +1108,7 @@ def pvp_room(subject, room):
                     verdict="Неверный ответ, попробуйте снова",
                 )
             db_sess.add(submission_result)
+            stats.record_submission(db_sess, submission_result)
             db_sess.commit()
 
             uid = str(current_user.id)
@@ -1172,9 +1125,10 @@ def pvp_room(subject, room):
             players_info.append({'name': user.name, 'elo': user.elo_rating})
 
         last_submission = db_sess.query(Submissions).filter(Submissions.user_id == current_user.id,
-                                                    Submissions.task_id == task_id).all()
+                                                    Submissions.task_id == task_id).order_by(
+            Submissions.created_at.desc(), Submissions.id.desc()).first()
         if last_submission:
-            result = last_submission[-1]
+            result = last_submission
             verdict = result.verdict
         else:
             verdict = "Нет сданных решений"
@@ -1182,7 +1136,7 @@ def pvp_room(subject, room):
 
 
 def finish_match(room):
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     players = matches[room]['players']
     completed = matches[room]['completed']
 
@@ -1203,11 +1157,36 @@ def finish_match(room):
         result = "Ничья"
 
     db_sess.commit()
+    user_cache.invalidate(user1_id, user2_id)
     matches[room]['finished'] = True
     matches[room]['result'] = result
     return result
 
 
+@db_scoped
+def on_judged(submission, room):
+    socketio.emit('verdict', {
+        'submission_id': submission.id,
+        'task_id': submission.task_id,
+        'verdict': submission.verdict,
+        'test_passed': submission.total_tests
+    }, room=f"judge_{submission.user_id}")
+    if room is None or room not in matches or matches[room].get('finished'):
+        return
+    ochko = 1 if submission.verdict == "OK" else 0
+    matches[room]['completed'][str(submission.user_id)] = ochko
+    if ochko == 1:
+        result = finish_match(room)
+        socketio.emit('match_finished', {'result': result}, room=room)
+
+
+judge.init(app.config['JUDGE_WORKERS'], on_result=on_judged,
+           test_workers=app.config['JUDGE_TEST_WORKERS'],
+           stop_on_fail=app.config['JUDGE_STOP_ON_FAIL'],
+           sandbox_pool=app.config['JUDGE_SANDBOX_POOL'],
+           output_limit=app.config['JUDGE_OUTPUT_LIMIT'])
+
+
 @app.route('/<subject>/pvp/results/<room>')
 @login_required
 @user_ban
@@ -1215,7 +1194,7 @@ def pvp_results(subject, room):
     if room not in matches or not matches[room].get('finished'):
         return redirect(f"/{subject}/")
 
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
 
     players_data = []
     result_text = matches[room]['result']
@@ -1243,13 +1222,21 @@ def pvp_results(subject, room):
 
 
 @socketio.on('join')
+@db_scoped
 def on_join(data):
-    room = data['room']
-    join_room(room)
-    if room not in matches:
+    room = data.get('room')
+    if not current_user.is_authenticated or not isinstance(room, str):
         return
+    if room.startswith('judge_'):
+        if room != f"judge_{current_user.id}":
+            return
+        join_room(room)
+        return
+    if room not in matches or current_user.id not in matches[room]['players']:
+        return
+    join_room(room)
 
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     scores = []
     for user_id_str, score in matches[room]['completed'].items():
         user = db_sess.get(User, int(user_id_str))
@@ -1265,6 +1252,7 @@ def on_join(data):
 
 
 @socketio.on('submit_code')
+@db_scoped
 def on_submit(data):
     room = data['room']
     if room not in matches or current_user.id not in matches[room]['players']:
@@ -1273,7 +1261,7 @@ def on_submit(data):
     uid = str(current_user.id)
     matches[room]['completed'][uid] = max(matches[room]['completed'].get(uid, 0), data.get('test_passed', 0))
 
-    db_sess = db_session.create_session()
+    db_sess = db_session.get_session()
     scores = []
     for user_id_str, score in matches[room]['completed'].items():
         user = db_sess.get(User, int(user_id_str))
@@ -1288,5 +1276,59 @@ def on_submit(data):
         emit('match_finished', {'result': result}, room=room)
 
 
+@app.cli.command('rebuild-stats')
+def rebuild_stats():
+    db_sess = db_session.get_session()
+    count = stats.rebuild(db_sess)
+    db_sess.flush()
+    themes = stats.rebuild_analytics(db_sess)
+    stats.reset_rollups(db_sess)
+    db_sess.commit()
+    rolled = 0
+    while True:
+        batch = stats.run_rollup(db_sess)
+        if not batch:
+            break
+        rolled += batch
+    print(f"Пересчитано записей статистики: {count}, тем в аналитике: {themes}, "
+          f"посылок в сводках: {rolled}")
+
+
+@app.cli.command('seed-tasks')
+@click.argument('subject')
+@click.option('--count', default=10, help='Количество задач на каждую сложность')
+@click.option('--difficulty', default='легкая,средняя,сложная', help='Сложности через запятую')
+def seed_tasks(subject, count, difficulty):
+    if subject not in subjects:
+        raise click.BadParameter(f"Неизвестный предмет «{subject}»")
+    grid = [(subject, level.strip()) for level in difficulty.split(',') if level.strip()]
+    db_sess = db_session.get_session()
+    created = duplicates = 0
+    for (subject, level), generated in generate_batch(grid, count).items():
+        for ai_task in generated:
+            if not task_pool.valid(ai_task, subject):
+                continue
+            error = task_service.check_reference(subject, level, ai_task)
+            if error:
+                print(f"Задача отклонена: {error}")
+                continue
+            task, tests = task_service.from_ai(subject, level, ai_task)
+            if task_service.create_task(db_sess, task, tests, reuse_duplicate=True) is task:
+                created += 1
+            else:
+                duplicates += 1
+    print(f"Создано задач: {created} из {len(grid) * count}, совпали с существующими: {duplicates}")
+
+
+@app.cli.command('copy-db')
+@click.argument('target')
+def copy_db(target):
+    copied = migrations.copy_database(app.config['DATABASE_URL'], target)
+    for table, count in copied.items():
+        print(f"{table}: {count}")
+    print(f"Данные скопированы в {db_session.database_url(target).render_as_string(hide_password=True)}")
+
+
 if __name__ == '__main__':
+    start_background()
     socketio.run(app, port=8080, host='127.0.0.1', allow_unsafe_werkzeug=True, debug=True)
@@ -0,0 +1,73 @@
+import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import make_response, request
+from sqlalchemy import func
+
+from data.tasks import Tasks
+
+MAX_ENTRIES = 4096
+
+_fragments = OrderedDict()
+_lock = threading.Lock()
+
+
+def fragment(key, stamp, render):
+    with _lock:
+        entry = _fragments.get(key)
+        if entry is not None and entry[0] == stamp:
+            _fragments.move_to_end(key)
+            return entry[1]
+    value = render()
+    with _lock:
+        _fragments[key] = (stamp, value)
+        _fragments.move_to_end(key)
+        while len(_fragments) > MAX_ENTRIES:
+            _fragments.popitem(last=False)
+    return value
+
+
+def invalidate_task(task_id):
+    with _lock:
+        _fragments.pop(("statement", task_id), None)
+
+
+def invalidate_subject(subject):
+    with _lock:
+        _fragments.pop(("filters", subject), None)
+
+
+def clear():
+    with _lock:
+        _fragments.clear()
+
+
+def task_stamp(task):
+    return task.updated_at or task.created_at
+
+
+def subject_stamp(db_sess, subject):
+    count, last = db_sess.query(
+        func.count(Tasks.id),
+        func.max(func.coalesce(Tasks.updated_at, Tasks.created_at))
+    ).filter(Tasks.subject == subject).one()
+    return count, last
+
+
+def conditional(parts, last_modified, render):
+    etag = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.astimezone(datetime.timezone.utc).replace(microsecond=0)
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and last_modified is not None and request.if_modified_since is not None
+            and last_modified <= request.if_modified_since):
+        response = make_response("", 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,79 @@
+import threading
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_reports = {}
+_lock = threading.Lock()
+_config = {"enabled": False}
+
+
+def init(app, enabled=True):
+    _config["enabled"] = bool(enabled)
+    if not _config["enabled"]:
+        return
+    event.listen(Engine, "before_cursor_execute", _capture)
+    app.after_request(_explain_request)
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if executemany or not has_request_context():
+        return
+    if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+        return
+    if "queries" not in g:
+        g.queries = []
+    g.queries.append((conn.engine, statement, parameters))
+
+
+def _explain_request(response):
+    queries = g.pop("queries", None)
+    if not queries:
+        return response
+    endpoint = request.endpoint or request.path
+    with _lock:
+        known = _reports.setdefault(endpoint, {})
+        fresh = [q for q in queries if q[1] not in known]
+        for _, statement, _ in fresh:
+            known[statement] = None
+    for engine, statement, parameters in fresh:
+        try:
+            plan = explain(engine, statement, parameters)
+        except Exception as e:
+            plan = [f"Не удалось получить план: {e}"]
+        with _lock:
+            _reports[endpoint][statement] = plan
+    return response
+
+
+def explain(engine, statement, parameters=()):
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters or ()).fetchall()
+    if engine.dialect.name == "sqlite":
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def full_scan(plan):
+    for line in plan or ():
+        if line.startswith("SCAN ") and "USING" not in line and "CONSTANT ROW" not in line:
+            return True
+        if line.lstrip().startswith("Seq Scan"):
+            return True
+    return False
+
+
+def report():
+    with _lock:
+        return {
+            endpoint: [{"statement": statement, "plan": plan or [], "full_scan": full_scan(plan)}
+                       for statement, plan in statements.items()]
+            for endpoint, statements in sorted(_reports.items())
+        }
+
+
+def reset():
+    with _lock:
+        _reports.clear()
@@ -0,0 +1,331 @@
+import json
+import math
+import os
+import queue
+import selectors
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import checker
+import storage
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RunResult = namedtuple("RunResult", ["stdout", "stderr", "returncode", "timed_out",
+                                     "wall_time", "cpu_time", "max_rss", "output_exceeded", "accepted"])
+
+# modules imported once in the runner so submissions don't pay for them on every test
+PRELOAD = ["math", "collections", "itertools", "functools", "heapq", "bisect", "re", "string", "traceback"]
+
+# max_rss of an empty submission in this runner, subtracted so only the submission's own memory is reported
+_baseline = 0
+
+
+def available():
+    return hasattr(os, "fork")
+
+
+def _address_space():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _max_rss(usage):
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def apply_limits(memory_limit=None, cpu_limit=None, output_limit=None, base=None):
+    if resource is None:
+        return
+    if memory_limit:
+        if base is None:
+            base = _address_space()
+        if base is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (base + memory_limit, base + memory_limit))
+    if cpu_limit:
+        seconds = math.ceil(cpu_limit)
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+    if output_limit:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (output_limit, output_limit))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _send(stream, message):
+    data = json.dumps(message).encode("utf-8")
+    stream.write(struct.pack(">I", len(data)) + data)
+    stream.flush()
+
+
+def _receive(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    (size,) = struct.unpack(">I", header)
+    return json.loads(stream.read(size).decode("utf-8"))
+
+
+class Runner:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            start_new_session=True
+        )
+        self._lock = threading.Lock()
+        self._child = None
+
+    def run(self, request):
+        _send(self.process.stdin, request)
+        started = _receive(self.process.stdout)
+        if started is None:
+            return None
+        with self._lock:
+            self._child = started["pid"]
+        try:
+            return _receive(self.process.stdout)
+        finally:
+            with self._lock:
+                self._child = None
+
+    def execute(self, source, stdin_data, time_limit, memory_limit=None, output_limit=None, stdin_path=None,
+                checker_spec=None):
+        try:
+            result = self.run({
+                "source": source,
+                "stdin": stdin_data or "",
+                "stdin_path": stdin_path,
+                "time_limit": time_limit,
+                "memory_limit": memory_limit,
+                "output_limit": output_limit,
+                "checker": checker_spec
+            })
+        except (BrokenPipeError, OSError, ValueError):
+            result = None
+        if result is None:
+            return None
+        return RunResult(**result)
+
+    def cancel(self):
+        # the submission runs in its own process group, so the runner itself stays warm
+        with self._lock:
+            if self._child is not None:
+                _kill(self._child)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+
+
+class SandboxPool:
+    def __init__(self, size):
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(Runner())
+
+    def acquire(self):
+        runner = self._idle.get()
+        if not runner.alive():
+            runner = Runner()
+        return runner
+
+    def release(self, runner):
+        if not runner.alive():
+            runner = Runner()
+        self._idle.put(runner)
+
+    def run(self, runner, source, stdin_data, time_limit, memory_limit=None, output_limit=None, stdin_path=None,
+            checker_spec=None):
+        return runner.execute(source, stdin_data, time_limit, memory_limit, output_limit, stdin_path, checker_spec)
+
+
+def _read_all(out_fd, err_fd, child_stdin, stdin_data, stdin_path, deadline, output_limit, output_checker):
+    chunks = {out_fd: [], err_fd: []}
+    sizes = {out_fd: 0, err_fd: 0}
+    writer = threading.Thread(target=_feed, args=(child_stdin, stdin_data, stdin_path), daemon=True)
+    writer.start()
+    selector = selectors.DefaultSelector()
+    selector.register(out_fd, selectors.EVENT_READ)
+    selector.register(err_fd, selectors.EVENT_READ)
+    open_fds = 2
+    try:
+        while open_fds:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return chunks, "timeout"
+            for key, _ in selector.select(timeout):
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fd)
+                    open_fds -= 1
+                    continue
+                sizes[key.fd] += len(data)
+                if output_limit and sizes[key.fd] > output_limit:
+                    return chunks, "output"
+                if key.fd == out_fd and output_checker is not None:
+                    if not output_checker.feed(data):
+                        return chunks, "mismatch"
+                else:
+                    chunks[key.fd].append(data)
+    finally:
+        selector.close()
+    return chunks, None
+
+
+def _feed(fd, data, stdin_path):
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            if stdin_path:
+                with storage.open_path(stdin_path) as f:
+                    shutil.copyfileobj(f, stream, storage.CHUNK_SIZE)
+            else:
+                stream.write(data)
+    except (BrokenPipeError, OSError):
+        pass
+
+
+def _child(request, stdin_r, stdout_w, stderr_w):
+    os.setpgid(0, 0)
+    os.dup2(stdin_r, 0)
+    os.dup2(stdout_w, 1)
+    os.dup2(stderr_w, 2)
+    for fd in (stdin_r, stdout_w, stderr_w):
+        os.close(fd)
+    sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+    sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", closefd=False)
+    code = 0
+    try:
+        code_object = compile(request["source"], "submission.py", "exec")
+        apply_limits(request.get("memory_limit"), request["time_limit"], request.get("output_limit"))
+        exec(code_object, {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        import traceback
+        exc_type, exc, tb = sys.exc_info()
+        traceback.print_exception(exc_type, exc, tb.tb_next)
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(code)
+
+
+def _kill(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def _reap(pid, deadline):
+    # the child may close its pipes and keep running, so waiting must respect the deadline too
+    while True:
+        waited, status, usage = os.wait4(pid, os.WNOHANG)
+        if waited:
+            return status, usage, False
+        if time.monotonic() >= deadline:
+            _kill(pid)
+            _, status, usage = os.wait4(pid, 0)
+            return status, usage, True
+        time.sleep(0.005)
+
+
+def _execute(request, on_start=None):
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        for fd in (stdin_w, stdout_r, stderr_r):
+            os.close(fd)
+        _child(request, stdin_r, stdout_w, stderr_w)
+    try:
+        os.setpgid(pid, pid)
+    except OSError:
+        pass
+    for fd in (stdin_r, stdout_w, stderr_w):
+        os.close(fd)
+    if on_start is not None:
+        on_start(pid)
+
+    deadline = started + float(request["time_limit"])
+    output_checker = checker.create(request["checker"]) if request.get("checker") else None
+    try:
+        chunks, reason = _read_all(stdout_r, stderr_r, stdin_w, request["stdin"].encode("utf-8"),
+                                   request.get("stdin_path"), deadline, request.get("output_limit"), output_checker)
+        if reason is not None:
+            _kill(pid)
+        status, usage, timed_out = _reap(pid, deadline)
+        if timed_out and reason is None:
+            reason = "timeout"
+        wall_time = time.monotonic() - started
+        os.close(stdout_r)
+        os.close(stderr_r)
+        accepted = None
+        if output_checker is not None:
+            accepted = reason is None and output_checker.finish()
+    finally:
+        if output_checker is not None:
+            output_checker.close()
+
+    return {
+        "stdout": b"".join(chunks[stdout_r]).decode("utf-8", "replace").replace("\r\n", "\n"),
+        "stderr": b"".join(chunks[stderr_r]).decode("utf-8", "replace"),
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": reason == "timeout",
+        "wall_time": wall_time,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "max_rss": max(0, _max_rss(usage) - _baseline),
+        "output_exceeded": reason == "output",
+        "accepted": accepted
+    }
+
+
+def _serve():
+    global _baseline
+    for name in PRELOAD:
+        __import__(name)
+    _baseline = _execute({"source": "", "stdin": "", "time_limit": 5})["max_rss"]
+    requests_in = sys.stdin.buffer
+    responses_out = sys.stdout.buffer
+    while True:
+        request = _receive(requests_in)
+        if request is None:
+            return
+        _send(responses_out, _execute(request, lambda pid: _send(responses_out, {"pid": pid})))
+
+
+if __name__ == "__main__":
+    _serve()
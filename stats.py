@@ -0,0 +1,371 @@
+import datetime
+import threading
+import time
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from data import db_session
+from data.analytics_rollups import AnalyticsRollup
+from data.judge_jobs import JudgeJob
+from data.rollup_state import RollupState
+from data.submissions import Submissions, PENDING_VERDICT
+from data.tasks import Tasks
+from data.theme_stats import ThemeStats
+from data.user_task_stats import UserTaskStats
+
+NO_THEME = "Без темы"
+NO_DIFFICULTY = "Не указана"
+ROLLUP_BATCH = 5000
+ROLLUP_PERIODS = ("hour", "day")
+# a submission still pending after this long no longer holds back the rollup watermark
+PENDING_TIMEOUT = datetime.timedelta(hours=1)
+
+_rollup_lock = threading.Lock()
+_rollup_thread = None
+
+
+def record_submission(db_sess, submission):
+    if submission.id is None:
+        db_sess.flush()
+    created = submission.created_at or datetime.datetime.now()
+    ok = submission.verdict == "OK"
+    total = submission.total_tests or 0
+    pair = {"user_id": submission.user_id, "task_id": submission.task_id}
+
+    first_solve = False
+    if ok:
+        first_solve = bool(db_sess.query(UserTaskStats).filter_by(**pair).filter(
+            UserTaskStats.first_ok_at.is_(None)
+        ).update({UserTaskStats.solved: True, UserTaskStats.first_ok_at: created}, synchronize_session=False))
+
+    better = func.coalesce(UserTaskStats.best_total_tests, 0) <= total
+    values = {
+        UserTaskStats.attempts: UserTaskStats.attempts + 1,
+        UserTaskStats.best_submission_id: case((better, submission.id), else_=UserTaskStats.best_submission_id),
+        UserTaskStats.best_total_tests: case((better, submission.total_tests), else_=UserTaskStats.best_total_tests),
+        UserTaskStats.first_at: case((or_(UserTaskStats.first_at.is_(None), UserTaskStats.first_at > created), created),
+                                     else_=UserTaskStats.first_at),
+        UserTaskStats.last_at: case((or_(UserTaskStats.last_at.is_(None), UserTaskStats.last_at < created), created),
+                                    else_=UserTaskStats.last_at),
+    }
+    if ok and not first_solve:
+        values[UserTaskStats.first_ok_at] = case((UserTaskStats.first_ok_at > created, created),
+                                                 else_=UserTaskStats.first_ok_at)
+    inserted = _upsert(db_sess, UserTaskStats, pair, values, {
+        "attempts": 1,
+        "solved": ok,
+        "best_submission_id": submission.id,
+        "best_total_tests": submission.total_tests,
+        "first_at": created,
+        "first_ok_at": created if ok else None,
+        "last_at": created
+    })
+
+    solve_seconds = None
+    if ok and (first_solve or inserted):
+        solve_seconds = _solve_seconds(db_sess, **pair)
+    _record_theme(db_sess, submission.tasks, ok, solve_seconds)
+
+
+def remove_submission(db_sess, submission):
+    user_id, task_id = submission.user_id, submission.task_id
+    task = submission.tasks
+    ok = submission.verdict == "OK"
+    old_seconds = _solve_seconds(db_sess, user_id, task_id)
+    old_first = _first_solve(db_sess, user_id, task_id)
+    removed = (submission.id, submission.created_at)
+    # rows that still point at the submission would break the foreign keys on PostgreSQL
+    db_sess.query(UserTaskStats).filter(UserTaskStats.best_submission_id == submission.id).update(
+        {UserTaskStats.best_submission_id: None}, synchronize_session=False)
+    db_sess.query(JudgeJob).filter(JudgeJob.submission_id == submission.id).delete(synchronize_session=False)
+    db_sess.delete(submission)
+    db_sess.flush()
+    rebuild(db_sess, user_id, task_id)
+    db_sess.flush()
+    new_seconds = _solve_seconds(db_sess, user_id, task_id)
+    if task is None:
+        return
+    _unroll(db_sess, task, removed, ok, old_first, old_seconds, _first_solve(db_sess, user_id, task_id), new_seconds)
+    db_sess.query(ThemeStats).filter_by(**_theme_key(task)).update({
+        ThemeStats.total: ThemeStats.total - 1,
+        ThemeStats.ok: ThemeStats.ok - int(ok),
+        ThemeStats.solve_time_sum: ThemeStats.solve_time_sum + (new_seconds or 0) - (old_seconds or 0),
+        ThemeStats.solved_count: ThemeStats.solved_count + int(new_seconds is not None) - int(old_seconds is not None)
+    }, synchronize_session=False)
+
+
+def forget_task(db_sess, task_id):
+    db_sess.query(UserTaskStats).filter(UserTaskStats.task_id == task_id).delete(synchronize_session=False)
+
+
+def _upsert(db_sess, model, keys, values, initial):
+    query = db_sess.query(model).filter_by(**keys)
+    if query.update(values, synchronize_session=False):
+        return False
+    try:
+        with db_sess.begin_nested():
+            db_sess.add(model(**keys, **initial))
+        return True
+    except IntegrityError:
+        query.update(values, synchronize_session=False)
+        return False
+
+
+def _solve_seconds(db_sess, user_id, task_id):
+    row = db_sess.query(UserTaskStats.first_at, UserTaskStats.first_ok_at).filter(
+        UserTaskStats.user_id == user_id,
+        UserTaskStats.task_id == task_id
+    ).first()
+    if row is None or row.first_at is None or row.first_ok_at is None:
+        return None
+    return max(0.0, (row.first_ok_at - row.first_at).total_seconds())
+
+
+def _theme_key(task):
+    return {"subject": task.subject, "theme": task.theme or NO_THEME}
+
+
+def _record_theme(db_sess, task, ok, solve_seconds):
+    if task is None:
+        return
+    values = {
+        ThemeStats.total: ThemeStats.total + 1,
+        ThemeStats.ok: ThemeStats.ok + int(ok)
+    }
+    if solve_seconds is not None:
+        values[ThemeStats.solve_time_sum] = ThemeStats.solve_time_sum + solve_seconds
+        values[ThemeStats.solved_count] = ThemeStats.solved_count + 1
+    _upsert(db_sess, ThemeStats, _theme_key(task), values, {
+        "total": 1,
+        "ok": int(ok),
+        "solve_time_sum": solve_seconds or 0,
+        "solved_count": int(solve_seconds is not None)
+    })
+
+
+def rebuild(db_sess, user_id=None, task_id=None):
+    stats_query = db_sess.query(UserTaskStats)
+    submissions = db_sess.query(Submissions).filter(Submissions.verdict != PENDING_VERDICT)
+    if user_id is not None:
+        stats_query = stats_query.filter(UserTaskStats.user_id == user_id)
+        submissions = submissions.filter(Submissions.user_id == user_id)
+    if task_id is not None:
+        stats_query = stats_query.filter(UserTaskStats.task_id == task_id)
+        submissions = submissions.filter(Submissions.task_id == task_id)
+    stats_query.delete(synchronize_session=False)
+
+    rows = {}
+    for submission in submissions.order_by(Submissions.created_at, Submissions.id).yield_per(1000):
+        key = (submission.user_id, submission.task_id)
+        created = submission.created_at
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = UserTaskStats(user_id=submission.user_id, task_id=submission.task_id,
+                                            attempts=0, solved=False, first_at=created)
+        row.attempts += 1
+        row.last_at = created
+        if (submission.total_tests or 0) >= (row.best_total_tests or 0):
+            row.best_submission_id = submission.id
+            row.best_total_tests = submission.total_tests
+        if submission.verdict == "OK":
+            row.solved = True
+            if row.first_ok_at is None:
+                row.first_ok_at = created
+    db_sess.add_all(rows.values())
+    return len(rows)
+
+
+def rebuild_analytics(db_sess):
+    db_sess.query(ThemeStats).delete(synchronize_session=False)
+    rows = {}
+
+    def row_for(subject, theme):
+        key = (subject, theme or NO_THEME)
+        if key not in rows:
+            rows[key] = ThemeStats(subject=key[0], theme=key[1], total=0, ok=0, solve_time_sum=0, solved_count=0)
+        return rows[key]
+
+    totals = db_sess.query(
+        Tasks.subject, Tasks.theme,
+        func.count(Submissions.id),
+        func.sum(case((Submissions.verdict == "OK", 1), else_=0))
+    ).join(Submissions.tasks).filter(Submissions.verdict != PENDING_VERDICT).group_by(Tasks.subject, Tasks.theme)
+    for subject, theme, total, ok in totals:
+        row = row_for(subject, theme)
+        row.total += total
+        row.ok += ok or 0
+
+    solved = db_sess.query(Tasks.subject, Tasks.theme, UserTaskStats.first_at, UserTaskStats.first_ok_at).join(
+        UserTaskStats.task).filter(UserTaskStats.first_ok_at.isnot(None))
+    for subject, theme, first_at, first_ok_at in solved.yield_per(1000):
+        row = row_for(subject, theme)
+        row.solve_time_sum += max(0.0, (first_ok_at - first_at).total_seconds())
+        row.solved_count += 1
+    db_sess.add_all(rows.values())
+    return len(rows)
+
+
+def bucket_start(moment, period):
+    if period == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def run_rollup(db_sess):
+    state = db_sess.get(RollupState, "submissions")
+    if state is None:
+        try:
+            with db_sess.begin_nested():
+                db_sess.add(RollupState(name="submissions", last_id=0))
+        except IntegrityError:
+            pass
+        state = db_sess.get(RollupState, "submissions")
+    last_id = state.last_id
+
+    first_pending = db_sess.query(func.min(Submissions.id)).filter(
+        Submissions.id > last_id,
+        Submissions.verdict == PENDING_VERDICT,
+        Submissions.created_at >= datetime.datetime.now() - PENDING_TIMEOUT
+    ).scalar()
+    ready = db_sess.query(Submissions.id).filter(Submissions.id > last_id)
+    if first_pending is not None:
+        ready = ready.filter(Submissions.id < first_pending)
+    ids = [row[0] for row in ready.order_by(Submissions.id).limit(ROLLUP_BATCH)]
+    if not ids:
+        db_sess.rollback()
+        return 0
+
+    claimed = db_sess.query(RollupState).filter(
+        RollupState.name == "submissions",
+        RollupState.last_id == last_id
+    ).update({RollupState.last_id: ids[-1]}, synchronize_session=False)
+    if not claimed:
+        db_sess.rollback()
+        return 0
+
+    batch = db_sess.query(Submissions, Tasks).join(Submissions.tasks).filter(
+        Submissions.id >= ids[0],
+        Submissions.id <= ids[-1]
+    ).order_by(Submissions.id).all()
+    ok_pairs = {(s.user_id, s.task_id) for s, _ in batch if s.verdict == "OK"}
+    first_solves = {}
+    if ok_pairs:
+        pair_stats = db_sess.query(UserTaskStats).filter(
+            UserTaskStats.user_id.in_({pair[0] for pair in ok_pairs}),
+            UserTaskStats.task_id.in_({pair[1] for pair in ok_pairs}),
+            UserTaskStats.first_ok_at.isnot(None)
+        )
+        for row in pair_stats:
+            if (row.user_id, row.task_id) in ok_pairs:
+                first_solves[(row.user_id, row.task_id)] = row
+
+    counters = {}
+    for submission, task in batch:
+        if submission.created_at is None:
+            continue
+        ok = submission.verdict == "OK"
+        solve_seconds = None
+        row = first_solves.get((submission.user_id, submission.task_id))
+        if ok and row is not None and row.first_ok_at == submission.created_at:
+            solve_seconds = max(0.0, (row.first_ok_at - row.first_at).total_seconds())
+            del first_solves[(submission.user_id, submission.task_id)]
+        for period in ROLLUP_PERIODS:
+            key = (period, bucket_start(submission.created_at, period), task.subject,
+                   task.theme or NO_THEME, task.difficulty or NO_DIFFICULTY)
+            counter = counters.setdefault(key, [0, 0, 0.0, 0])
+            counter[0] += 1
+            counter[1] += int(ok)
+            if solve_seconds is not None:
+                counter[2] += solve_seconds
+                counter[3] += 1
+
+    for (period, bucket, subject, theme, difficulty), (total, ok, solve_sum, solved) in counters.items():
+        _upsert(db_sess, AnalyticsRollup, {
+            "period": period,
+            "bucket": bucket,
+            "subject": subject,
+            "theme": theme,
+            "difficulty": difficulty
+        }, {
+            AnalyticsRollup.total: AnalyticsRollup.total + total,
+            AnalyticsRollup.ok: AnalyticsRollup.ok + ok,
+            AnalyticsRollup.solve_time_sum: AnalyticsRollup.solve_time_sum + solve_sum,
+            AnalyticsRollup.solved_count: AnalyticsRollup.solved_count + solved
+        }, {
+            "total": total,
+            "ok": ok,
+            "solve_time_sum": solve_sum,
+            "solved_count": solved
+        })
+    db_sess.commit()
+    return len(ids)
+
+
+def _first_solve(db_sess, user_id, task_id):
+    return db_sess.query(Submissions.id, Submissions.created_at).join(
+        UserTaskStats, (UserTaskStats.user_id == Submissions.user_id) & (UserTaskStats.task_id == Submissions.task_id)
+    ).filter(
+        Submissions.user_id == user_id,
+        Submissions.task_id == task_id,
+        Submissions.verdict == "OK",
+        Submissions.created_at == UserTaskStats.first_ok_at
+    ).order_by(Submissions.id).first()
+
+
+def _unroll(db_sess, task, removed, ok, old_first, old_seconds, new_first, new_seconds):
+    state = db_sess.get(RollupState, "submissions")
+    if state is None:
+        return
+    changes = []
+    if removed[0] <= state.last_id and removed[1] is not None:
+        changes.append((removed[1], -1, -int(ok), 0, 0))
+    if old_first is not None and old_seconds is not None and old_first.id <= state.last_id:
+        changes.append((old_first.created_at, 0, 0, -old_seconds, -1))
+    if new_first is not None and new_seconds is not None and new_first.id <= state.last_id:
+        changes.append((new_first.created_at, 0, 0, new_seconds, 1))
+    for moment, total, ok_delta, seconds, solved in changes:
+        for period in ROLLUP_PERIODS:
+            db_sess.query(AnalyticsRollup).filter_by(
+                period=period,
+                bucket=bucket_start(moment, period),
+                subject=task.subject,
+                theme=task.theme or NO_THEME,
+                difficulty=task.difficulty or NO_DIFFICULTY
+            ).update({
+                AnalyticsRollup.total: AnalyticsRollup.total + total,
+                AnalyticsRollup.ok: AnalyticsRollup.ok + ok_delta,
+                AnalyticsRollup.solve_time_sum: AnalyticsRollup.solve_time_sum + seconds,
+                AnalyticsRollup.solved_count: AnalyticsRollup.solved_count + solved
+            }, synchronize_session=False)
+
+
+def reset_rollups(db_sess):
+    db_sess.query(AnalyticsRollup).delete(synchronize_session=False)
+    db_sess.query(RollupState).delete(synchronize_session=False)
+
+
+def start_rollups(interval):
+    global _rollup_thread
+    if not interval or _rollup_thread is not None:
+        return _rollup_thread
+    with _rollup_lock:
+        if _rollup_thread is None:
+            _rollup_thread = threading.Thread(target=_rollup_loop, args=(interval,), name="analytics-rollup",
+                                              daemon=True)
+            _rollup_thread.start()
+    return _rollup_thread
+
+
+def _rollup_loop(interval):
+    while True:
+        db_sess = db_session.create_session()
+        try:
+            while run_rollup(db_sess):
+                pass
+        except Exception as e:
+            db_sess.rollback()
+            print(f"Ошибка обновления аналитики: {e}")
+        finally:
+            db_sess.close()
+        time.sleep(interval)
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+
+ROOT = os.path.abspath("storage")
+COMPRESS_THRESHOLD = 4096
+INLINE_LIMIT = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+
+_config = {"compress": True}
+
+
+def init(root="storage", compress=True):
+    global ROOT
+    ROOT = os.path.abspath(root)
+    _config["compress"] = compress
+    os.makedirs(ROOT, exist_ok=True)
+
+
+def _object_path(digest):
+    return os.path.join(ROOT, digest[:2], digest[2:])
+
+
+def path(digest):
+    plain = _object_path(digest)
+    if os.path.exists(plain):
+        return plain
+    if os.path.exists(plain + ".gz"):
+        return plain + ".gz"
+    return None
+
+
+def exists(digest):
+    return path(digest) is not None
+
+
+def put(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    if exists(digest):
+        return digest
+    target = _object_path(digest)
+    compress = _config["compress"] and len(data) > COMPRESS_THRESHOLD
+    if compress:
+        data = gzip.compress(data)
+        target += ".gz"
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, target)
+    return digest
+
+
+def put_stream(stream):
+    os.makedirs(ROOT, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=ROOT)
+    with os.fdopen(fd, "wb") as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+            size += len(chunk)
+            f.write(chunk)
+    digest = sha.hexdigest()
+    if exists(digest):
+        os.remove(tmp)
+        return digest
+    target = _object_path(digest)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if _config["compress"] and size > COMPRESS_THRESHOLD:
+        with open(tmp, "rb") as src, gzip.open(target + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(target + ".gz.tmp", target + ".gz")
+        os.remove(tmp)
+    else:
+        os.replace(tmp, target)
+    return digest
+
+
+def open_path(object_path):
+    if object_path.endswith(".gz"):
+        return gzip.open(object_path, "rb")
+    return open(object_path, "rb")
+
+
+def open_blob(digest):
+    object_path = path(digest)
+    if object_path is None:
+        raise FileNotFoundError(f"Объект {digest} не найден в хранилище")
+    return open_path(object_path)
+
+
+def read_bytes(digest):
+    with open_blob(digest) as f:
+        return f.read()
+
+
+def read_text(digest):
+    return read_bytes(digest).decode("utf-8", "replace")
@@ -0,0 +1,144 @@
+import csv
+import io
+import zipfile
+import zlib
+
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from data import db_session
+from data.submissions import Submissions
+from data.task_tests import TaskTest
+from data.tasks import Tasks
+
+BATCH_SIZE = 500
+FORMATS = ("csv", "csv.gz", "zip")
+
+TASK_HEADER = ['ID', 'SUBJECT', 'THEME', 'DIFFICULTY', 'TITLE', 'STATEMENT', 'INPUT_FORMAT', 'OUTPUT_FORMAT',
+               'TIME_LIMIT', 'MEMORY_LIMIT', 'EXTERNAL_ID', 'CHECKER']
+SUBMISSION_HEADER = ['ID', 'USER_ID', 'TASK_ID', 'VERDICT', 'TOTAL_TESTS', 'CREATED_AT', 'SOURCE_HASH']
+
+
+class _Sink:
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _csv_line(row):
+    line = io.StringIO()
+    csv.writer(line).writerow(row)
+    return line.getvalue().encode("utf-8")
+
+
+def task_rows(db_sess, include_tests=False, batch_size=BATCH_SIZE):
+    test_count = 0
+    query = db_sess.query(Tasks).order_by(Tasks.id)
+    if include_tests:
+        test_count = db_sess.query(func.count(TaskTest.id)).group_by(TaskTest.task_id).order_by(
+            func.count(TaskTest.id).desc()).limit(1).scalar() or 0
+        query = query.options(selectinload(Tasks.task_tests))
+    header = list(TASK_HEADER)
+    for i in range(1, test_count + 1):
+        header += [f'TEST{i}_INPUT', f'TEST{i}_OUTPUT']
+    yield header
+
+    for task in query.yield_per(batch_size):
+        row = [
+            task.id,
+            task.subject,
+            task.theme,
+            task.difficulty,
+            task.title,
+            task.statement,
+            task.input_format,
+            task.output_format,
+            task.time_limit,
+            task.memory_limit,
+            task.external_id,
+            task.checker
+        ]
+        if include_tests:
+            for test in task.task_tests:
+                row += [test.get_input(), test.get_output()]
+            row += [None, None] * (test_count - len(task.task_tests))
+        yield row
+
+
+def submission_rows(db_sess, batch_size=BATCH_SIZE):
+    yield SUBMISSION_HEADER
+    query = db_sess.query(
+        Submissions.id, Submissions.user_id, Submissions.task_id, Submissions.verdict,
+        Submissions.total_tests, Submissions.created_at, Submissions.source_hash
+    ).order_by(Submissions.id)
+    for row in query.yield_per(batch_size):
+        yield list(row)
+
+
+def stream(fmt="csv", include_tests=False, include_submissions=False, batch_size=BATCH_SIZE):
+    # the response body outlives the request scope, so the export owns its session
+    db_sess = db_session.create_session(track=False)
+    try:
+        yield from _stream(db_sess, fmt, include_tests, include_submissions, batch_size)
+    finally:
+        db_sess.close()
+
+
+def _stream(db_sess, fmt, include_tests, include_submissions, batch_size):
+    if fmt == "zip":
+        yield from _stream_zip(db_sess, include_tests, include_submissions, batch_size)
+        return
+    rows = task_rows(db_sess, include_tests, batch_size)
+    if fmt == "csv.gz":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in _chunks(rows, batch_size):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+        return
+    yield from _chunks(rows, batch_size)
+
+
+def _chunks(rows, batch_size):
+    chunk = []
+    for i, row in enumerate(rows, 1):
+        chunk.append(_csv_line(row))
+        if i % batch_size == 0:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
+
+
+def _stream_zip(db_sess, include_tests, include_submissions, batch_size):
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    files = [("tasks.csv", task_rows(db_sess, include_tests, batch_size))]
+    if include_submissions:
+        files.append(("submissions.csv", submission_rows(db_sess, batch_size)))
+    for name, rows in files:
+        with archive.open(name, "w", force_zip64=True) as entry:
+            for chunk in _chunks(rows, batch_size):
+                entry.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data
+    archive.close()
+    yield sink.drain()
@@ -0,0 +1,195 @@
+import csv
+import datetime
+import io
+import re
+from collections import namedtuple
+
+from sqlalchemy.orm import selectinload
+
+import dedup
+import judge
+from checker import validate_spec
+import page_cache
+from data.task_tests import TaskTest
+from data.test_results import TestResult
+from data.tasks import Tasks
+
+BATCH_SIZE = 500
+MAX_ERRORS = 200
+MAX_FIELD_SIZE = 64 * 1024 ** 2
+DIFFICULTIES = ('легкая', 'средняя', 'сложная')
+
+FIELDS = {
+    "SUBJECT": "subject",
+    "THEME": "theme",
+    "DIFFICULTY": "difficulty",
+    "TITLE": "title",
+    "STATEMENT": "statement",
+    "INPUT_FORMAT": "input_format",
+    "OUTPUT_FORMAT": "output_format",
+    "TIME_LIMIT": "time_limit",
+    "MEMORY_LIMIT": "memory_limit",
+    "CHECKER": "checker",
+    "EXTERNAL_ID": "external_id",
+}
+TEST_COLUMN = re.compile(r"TEST(\d+)_(INPUT|OUTPUT)$")
+
+ImportReport = namedtuple("ImportReport", ["created", "updated", "errors", "duplicates", "linked"],
+                          defaults=(0, 0))
+
+
+def import_csv(db_sess, stream, subjects, batch_size=BATCH_SIZE):
+    csv.field_size_limit(MAX_FIELD_SIZE)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text, delimiter=",")
+    header = next(reader, None)
+    if header is None:
+        return ImportReport(0, 0, [(1, "Файл пуст")])
+    columns, tests = _columns(header)
+    if "title" not in columns.values() or "subject" not in columns.values():
+        return ImportReport(0, 0, [(1, "В заголовке нет столбцов SUBJECT и TITLE")])
+
+    totals = [0, 0, 0, 0]
+    errors = []
+    batch = []
+    for row in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        values, error = _parse_row(row, columns, tests, subjects)
+        if error:
+            if len(errors) < MAX_ERRORS:
+                errors.append((line, error))
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            totals = [total + count for total, count in zip(totals, _flush(db_sess, batch))]
+            batch = []
+    if batch:
+        totals = [total + count for total, count in zip(totals, _flush(db_sess, batch))]
+    text.detach()
+    created, updated, duplicates, linked = totals
+    return ImportReport(created, updated, errors, duplicates, linked)
+
+
+def _columns(header):
+    columns = {}
+    tests = {}
+    for index, name in enumerate(header):
+        name = name.strip().upper()
+        if name in FIELDS:
+            columns[index] = FIELDS[name]
+            continue
+        match = TEST_COLUMN.match(name)
+        if match:
+            tests.setdefault(int(match.group(1)), {})[match.group(2).lower()] = index
+    return columns, [tests[number] for number in sorted(tests)]
+
+
+def _parse_row(row, columns, tests, subjects):
+    values = {field: None for field in columns.values()}
+    for index, field in columns.items():
+        if index < len(row):
+            values[field] = row[index].strip() or None
+    values.setdefault("external_id", None)
+
+    if not values["subject"]:
+        return None, "Не указан предмет"
+    if values["subject"] not in subjects:
+        return None, f"Неизвестный предмет «{values['subject']}»"
+    if not values["title"]:
+        return None, "Не указано название задачи"
+    if values.get("difficulty") and values["difficulty"] not in DIFFICULTIES:
+        return None, f"Неизвестная сложность «{values['difficulty']}»"
+    if values.get("time_limit"):
+        try:
+            float(values["time_limit"].replace(",", "."))
+        except ValueError:
+            return None, f"Некорректный лимит времени «{values['time_limit']}»"
+    if values.get("memory_limit") and not re.match(r"\s*\d", values["memory_limit"]):
+        return None, f"Некорректный лимит памяти «{values['memory_limit']}»"
+    error = validate_spec(values.get("checker"))
+    if error:
+        return None, error
+
+    values["tests"] = []
+    for test in tests:
+        input_data = row[test["input"]] if "input" in test and test["input"] < len(row) else ""
+        output = row[test["output"]] if "output" in test and test["output"] < len(row) else ""
+        if input_data or output:
+            values["tests"].append((input_data, output or None))
+    return values, None
+
+
+def _replace_tests(db_sess, task, tests):
+    current = list(task.task_tests)
+    for test, (input_data, output) in zip(current, tests):
+        test.set_data(input_data, output)
+    surplus = [test.id for test in current[len(tests):] if test.id is not None]
+    if surplus:
+        db_sess.query(TestResult).filter(TestResult.test_id.in_(surplus)).update(
+            {TestResult.test_id: None}, synchronize_session=False)
+    for test in current[len(tests):]:
+        task.task_tests.remove(test)
+        db_sess.delete(test)
+    return tests[len(current):]
+
+
+def _flush(db_sess, batch):
+    keys = {values["external_id"] for values in batch if values["external_id"]}
+    existing = {}
+    if keys:
+        for task in db_sess.query(Tasks).options(selectinload(Tasks.task_tests)).filter(Tasks.external_id.in_(keys)):
+            existing[task.external_id] = task
+
+    fresh = {}
+    for i, values in enumerate(batch):
+        if values["external_id"] not in existing:
+            fresh[i] = Tasks(**{field: value for field, value in values.items() if field != "tests"})
+            dedup.attach(fresh[i])
+    found = dedup.find_duplicates(db_sess, list(fresh.values()))
+
+    created = updated = duplicates = linked = 0
+    tasks = set()
+    subjects = set()
+    for i, values in enumerate(batch):
+        tests = values.pop("tests")
+        task = existing.get(values["external_id"]) if values["external_id"] else None
+        if task is None:
+            task = fresh[i]
+            if task in found:
+                match = found[task]
+                if values["external_id"] and match.external_id is None:
+                    match.external_id = values["external_id"]
+                    existing[values["external_id"]] = match
+                    linked += 1
+                else:
+                    duplicates += 1
+                continue
+            db_sess.add(task)
+            if values["external_id"]:
+                existing[values["external_id"]] = task
+            created += 1
+        else:
+            for field, value in values.items():
+                setattr(task, field, value)
+            task.updated_at = datetime.datetime.now()
+            dedup.attach(task)
+            if tests:
+                tests = _replace_tests(db_sess, task, tests)
+            if task.id is not None:
+                judge.invalidate_task(db_sess, task.id)
+                tasks.add(task.id)
+            updated += 1
+        for input_data, output in tests:
+            test = TaskTest()
+            test.set_data(input_data, output)
+            task.task_tests.append(test)
+        subjects.add(task.subject)
+    db_sess.commit()
+
+    for task_id in tasks:
+        page_cache.invalidate_task(task_id)
+    for subject in subjects:
+        page_cache.invalidate_subject(subject)
+    return created, updated, duplicates, linked
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+
+from sqlalchemy import func
+
+import ai
+import dedup
+import task_service
+from data import db_session
+from data.ai_pool_tasks import AiPoolTask
+
+MAX_ATTEMPTS = 5
+BACKOFF = 2
+MAX_BACKOFF = 300
+
+_wake = threading.Event()
+_lock = threading.Lock()
+_config = {"size": 0, "keys": (), "interval": 60, "thread": None}
+
+
+def init(keys, size, interval=60):
+    _config["size"] = size
+    _config["keys"] = tuple(keys)
+    _config["interval"] = interval
+
+
+def start():
+    if not _config["size"] or not _config["keys"] or not ai.API_KEY:
+        return None
+    with _lock:
+        if _config["thread"] is None:
+            _config["thread"] = threading.Thread(target=_fill_loop, args=(_config["interval"],),
+                                                 name="ai-task-pool", daemon=True)
+            _config["thread"].start()
+    return _config["thread"]
+
+
+def refill(subject, difficulty):
+    with _lock:
+        if (subject, difficulty) not in _config["keys"]:
+            _config["keys"] += ((subject, difficulty),)
+    thread = start()
+    _wake.set()
+    return thread is not None
+
+
+def valid(payload, subject):
+    return ai.validate_task(payload, subject) is None
+
+
+def take(db_sess, subject, difficulty):
+    try:
+        while True:
+            entry = db_sess.query(AiPoolTask.id, AiPoolTask.payload).filter(
+                AiPoolTask.subject == subject,
+                AiPoolTask.difficulty == difficulty
+            ).order_by(AiPoolTask.id).first()
+            if entry is None:
+                return None
+            claimed = db_sess.query(AiPoolTask).filter(AiPoolTask.id == entry.id).delete(synchronize_session=False)
+            db_sess.commit()
+            if claimed:
+                return json.loads(entry.payload)
+    finally:
+        _wake.set()
+
+
+def put(db_sess, subject, difficulty, payload):
+    db_sess.add(AiPoolTask(subject=subject, difficulty=difficulty,
+                           payload=json.dumps(payload, ensure_ascii=False)))
+    db_sess.commit()
+
+
+def counts(db_sess):
+    rows = db_sess.query(AiPoolTask.subject, AiPoolTask.difficulty, func.count(AiPoolTask.id)).group_by(
+        AiPoolTask.subject, AiPoolTask.difficulty)
+    return {(subject, difficulty): count for subject, difficulty, count in rows}
+
+
+def fill():
+    db_sess = db_session.create_session()
+    try:
+        ready = counts(db_sess)
+        db_sess.rollback()
+        missing = {key: _config["size"] - ready.get(key, 0) for key in _config["keys"]}
+        missing = {key: count for key, count in missing.items() if count > 0}
+        added = 0
+        delay = BACKOFF
+        for attempt in range(MAX_ATTEMPTS):
+            if not missing:
+                break
+            if attempt:
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+            jobs = [key for key, count in missing.items() for _ in range(count)]
+            for (subject, difficulty), payloads in ai.generate_batch(jobs).items():
+                for payload in payloads:
+                    if missing[(subject, difficulty)] <= 0 or not valid(payload, subject):
+                        continue
+                    task, _ = task_service.from_ai(subject, difficulty, payload)
+                    dedup.attach(task)
+                    if dedup.find_duplicate(db_sess, task) is not None:
+                        continue
+                    error = task_service.check_reference(subject, difficulty, payload)
+                    if error:
+                        print(f"Задача для пула отклонена ({subject}, {difficulty}): {error}")
+                        continue
+                    put(db_sess, subject, difficulty, payload)
+                    missing[(subject, difficulty)] -= 1
+                    added += 1
+            missing = {key: count for key, count in missing.items() if count > 0}
+        for subject, difficulty in missing:
+            print(f"Не удалось сгенерировать задачу для пула: {subject}, {difficulty}")
+        return added
+    finally:
+        db_sess.close()
+
+
+def _fill_loop(interval):
+    while True:
+        _wake.clear()
+        try:
+            fill()
+        except Exception as e:
+            print(f"Ошибка пополнения пула задач: {e}")
+        _wake.wait(interval)
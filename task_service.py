@@ -0,0 +1,70 @@
+import re
+
+import dedup
+import judge
+import page_cache
+from data.task_tests import TaskTest
+from data.tasks import Tasks
+
+REFERENCE_FIELD = "эталонное решение"
+REFERENCE_TIME_SHARE = 0.5
+CODE_FENCE = re.compile(r"^```[\w+-]*\s*(.*?)\s*```$", re.S)
+
+
+def create_task(db_sess, task, tests=(), reuse_duplicate=False):
+    dedup.attach(task)
+    if reuse_duplicate:
+        duplicate = dedup.find_duplicate(db_sess, task)
+        if duplicate is not None:
+            return duplicate
+    for input_data, output in tests:
+        test = TaskTest()
+        test.set_data(input_data, output)
+        task.task_tests.append(test)
+    db_sess.add(task)
+    db_sess.flush()
+    db_sess.commit()
+    page_cache.invalidate_subject(task.subject)
+    return task
+
+
+def from_ai(subject, difficulty, ai_task):
+    task = Tasks(
+        subject=subject,
+        title=ai_task.get("название задачи"),
+        statement=ai_task.get("условие задачи"),
+        difficulty=difficulty,
+        theme=ai_task.get("тема")
+    )
+    if subject == 'информатика':
+        task.input_format = ai_task.get("входные данные")
+        task.output_format = ai_task.get("выходные данные")
+        task.memory_limit = ai_task.get("лимит памяти")
+        task.time_limit = ai_task.get("лимит времени")
+        tests = [(ai_task.get(f"входные данные тест {i}"), ai_task.get(f"выходные данные тест {i}"))
+                 for i in range(1, 6)]
+    else:
+        tests = [(ai_task.get("ответ"), None)]
+    return task, tests
+
+
+def check_reference(subject, difficulty, ai_task):
+    if subject != 'информатика':
+        return None
+    source = CODE_FENCE.sub(r"\1", str(ai_task.get(REFERENCE_FIELD) or "").strip())
+    if not source:
+        return "нет эталонного решения"
+    task, tests = from_ai(subject, difficulty, ai_task)
+    task_tests = []
+    for input_data, output in tests:
+        test = TaskTest()
+        test.set_data(input_data, output)
+        task_tests.append(test)
+    verdict, passed, results = judge.run_tests(source, task, task_tests, stop_on_fail=True)
+    if verdict != "OK":
+        return f"эталонное решение не прошло тесты ({verdict}), пройдено {passed} из {len(task_tests)}"
+    limit = judge.parse_time_limit(task.time_limit) * REFERENCE_TIME_SHARE
+    slowest = max(result[2].wall_time or 0 for result in results)
+    if slowest > limit:
+        return f"эталонное решение работает {slowest:.2f} с, допустимо не больше {limit:.2f} с"
+    return None
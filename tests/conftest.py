@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+import sqlalchemy.orm as orm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import __all_models, db_session, migrations  # noqa: E402,F401
+from data.db_session import SqlAlchemyBase  # noqa: E402
+
+# PostgreSQL runs only when a disposable database is given, e.g.
+# TEST_DATABASE_URL=postgresql://postgres@localhost/olympiad_test
+BACKENDS = ["sqlite"] + (["postgresql"] if os.environ.get("TEST_DATABASE_URL") else [])
+
+
+def backend_url(backend, tmp_path):
+    if backend == "sqlite":
+        return str(tmp_path / "task.db")
+    return os.environ["TEST_DATABASE_URL"]
+
+
+@pytest.fixture(params=BACKENDS)
+def engine(request, tmp_path):
+    engine = db_session.create_engine(backend_url(request.param, tmp_path))
+    SqlAlchemyBase.metadata.drop_all(engine)
+    migrations.upgrade(engine)
+    yield engine
+    SqlAlchemyBase.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db_sess(engine):
+    session = orm.sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    root = tmp_path_factory.mktemp("app")
+    patch = pytest.MonkeyPatch()
+    patch.setenv("DATABASE_URL", str(root / "task.db"))
+    patch.setenv("STORAGE_DIR", str(root / "storage"))
+    patch.setenv("JUDGE_WORKERS", "2")
+    patch.setenv("ANALYTICS_ROLLUP_INTERVAL", "0")
+    patch.delenv("AI_API_KEY", raising=False)
+    import main
+    main.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    yield main.app
+    patch.undo()
+
+
+@pytest.fixture
+def client(app):
+    from data.users import User
+    db_sess = db_session.create_session()
+    if db_sess.query(User).filter(User.email == "admin@example.com").first() is None:
+        user = User(name="admin", email="admin@example.com", admin=1, ban=0)
+        user.set_password("secret")
+        db_sess.add(user)
+        db_sess.commit()
+    db_sess.close()
+    client = app.test_client()
+    assert client.post("/login", data={"email": "admin@example.com", "password": "secret"}).status_code == 302
+    return client
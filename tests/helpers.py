@@ -0,0 +1,24 @@
+from data.task_tests import TaskTest
+from data.tasks import Tasks
+from data.users import User
+
+
+def make_user(db_sess, email="user@example.com"):
+    user = User(name="user", email=email)
+    user.set_password("secret")
+    db_sess.add(user)
+    db_sess.commit()
+    return user
+
+
+def make_task(db_sess, title="Сумма", time_limit="1.5", memory_limit="256 MB", tests=(("1 2", "3"),),
+              subject="информатика", statement="a+b"):
+    task = Tasks(subject=subject, title=title, statement=statement, difficulty="легкая",
+                 time_limit=time_limit, memory_limit=memory_limit)
+    for input_data, output in tests:
+        test = TaskTest()
+        test.set_data(input_data, output)
+        task.task_tests.append(test)
+    db_sess.add(task)
+    db_sess.commit()
+    return task
@@ -0,0 +1,76 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import ai
+import ai_stub
+
+
+def _informatics(**fields):
+    task = {"название задачи": "Сумма", "условие задачи": "Выведите a+b"}
+    for i in range(1, ai.TEST_COUNT + 1):
+        task[f"входные данные тест {i}"] = f"{i} 1"
+        task[f"выходные данные тест {i}"] = str(i + 1)
+    task.update(fields)
+    return task
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ai_stub.Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(ai, "URL", f"http://127.0.0.1:{server.server_port}")
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_task_repairs_common_json_mistakes():
+    text = "Вот задача:\n```json\n{'название задачи': \"Сумма\", 'условие задачи': \"Найдите \"сумму\" чисел\"," \
+           " 'ответ': \"4\", 'тема': ,}\n```\nУдачи!"
+
+    assert ai.parse_task(text, "математика") == {
+        "название задачи": "Сумма", "условие задачи": 'Найдите "сумму" чисел', "ответ": "4", "тема": ""}
+
+
+def test_parse_task_accepts_python_literals_and_lists():
+    task = _informatics(**{"Входные  Данные": ["Два числа", "через пробел"]})
+
+    assert ai.parse_task(repr(task), "информатика")["входные данные"] == "Два числа\nчерез пробел"
+
+
+def test_parse_task_normalizes_limits():
+    task = ai.parse_task(json.dumps(_informatics(**{"лимит времени": "1,5 сек", "лимит памяти": " 64 мб"})),
+                         "информатика")
+
+    assert (task["лимит времени"], task["лимит памяти"]) == ("1.5", "64 мб")
+
+
+@pytest.mark.parametrize("text, subject, error", [
+    ("не JSON", "математика", "Failed to parse AI response"),
+    ('{"название задачи": "Сумма", "условие задачи": "a+b"}', "математика", "Missing field: ответ"),
+    (json.dumps(_informatics(**{"выходные данные тест 3": ""})), "информатика",
+     "Missing field: выходные данные тест 3"),
+    (json.dumps(_informatics(**{"лимит времени": "секунда"})), "информатика", "Time limit is not a number: секунда"),
+])
+def test_parse_task_rejects_incomplete_answers(text, subject, error):
+    assert ai.parse_task(text, subject) == {"error": error}
+
+
+def test_generate_task_from_stub(stub):
+    task = ai.generate_task("легкая", "информатика")
+
+    assert task["название задачи"].startswith("Сумма чисел")
+    assert task["лимит времени"] == "1"
+    assert ai.generate_task("легкая", "химия")["ответ"] == "4"
+
+
+def test_generate_task_reports_unreachable_service(monkeypatch):
+    monkeypatch.setattr(ai, "URL", "http://127.0.0.1:9/")
+    monkeypatch.setattr(ai, "_client", {"session": None})
+    monkeypatch.setattr(ai, "MAX_RETRIES", 0)
+
+    assert ai.generate_task("легкая", "химия")["error"].startswith("AI request failed")
@@ -0,0 +1,28 @@
+import dedup
+from data.tasks import Tasks
+from helpers import make_task
+
+STATEMENT = "Даны два целых числа a и b, записанные через пробел. Выведите их сумму одним числом."
+
+
+def _candidate(title, statement, subject="информатика"):
+    task = Tasks(subject=subject, title=title, statement=statement)
+    dedup.attach(task)
+    return task
+
+
+def test_find_duplicate_matches_near_copies_only(db_sess):
+    original = make_task(db_sess, title="Сумма", statement=STATEMENT)
+    dedup.attach(original)
+    db_sess.commit()
+
+    assert dedup.find_duplicate(db_sess, _candidate("сумма", STATEMENT.replace("е", "ё").upper())) == original
+    assert dedup.find_duplicate(db_sess, _candidate("Разность", "Даны два числа. Выведите модуль их разности.")) is None
+    assert dedup.find_duplicate(db_sess, _candidate("Сумма", STATEMENT, subject="математика")) is None
+
+
+def test_find_duplicates_within_one_batch(db_sess):
+    first, second, other = (_candidate("Сумма", STATEMENT), _candidate("Сумма", STATEMENT + "!"),
+                            _candidate("Произведение", "Выведите произведение двух чисел."))
+
+    assert dedup.find_duplicates(db_sess, [first, second, other]) == {second: first}
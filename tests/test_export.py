@@ -0,0 +1,36 @@
+import csv
+import io
+
+import task_export
+from data import db_session
+from helpers import make_task
+
+
+def _engine():
+    db_sess = db_session.create_session()
+    engine = db_sess.get_bind()
+    db_sess.close()
+    return engine
+
+
+def test_export_stream_releases_its_connection(client):
+    db_sess = db_session.create_session()
+    make_task(db_sess, title="Экспорт", tests=(("1 2", "3"), ("2 2", "4")))
+    db_sess.close()
+
+    response = client.get("/export?tests=1")
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    response.close()
+
+    assert rows[0][:2] == ["ID", "SUBJECT"]
+    exported = [row for row in rows if row[4] == "Экспорт"]
+    assert exported and exported[0][-4:] == ["1 2", "3", "2 2", "4"]
+    assert _engine().pool.checkedout() == 0
+
+
+def test_abandoned_export_closes_its_session(app):
+    chunks = task_export.stream("csv", batch_size=1)
+    next(chunks), next(chunks)
+    assert _engine().pool.checkedout() == 1
+    chunks.close()
+    assert _engine().pool.checkedout() == 0
@@ -0,0 +1,72 @@
+import csv
+import io
+
+import dedup
+import task_export
+import task_import
+from data.task_tests import TaskTest
+from data.tasks import Tasks
+from helpers import make_task
+
+SUBJECTS = ["информатика", "математика"]
+STATEMENT = "Даны два целых числа a и b, записанные через пробел. Выведите их сумму одним числом."
+
+
+def _csv(*rows):
+    text = io.StringIO()
+    csv.writer(text).writerows(rows)
+    return io.BytesIO(text.getvalue().encode("utf-8"))
+
+
+def test_import_creates_updates_and_reports_errors(db_sess):
+    header = ["SUBJECT", "TITLE", "STATEMENT", "DIFFICULTY", "EXTERNAL_ID", "TEST1_INPUT", "TEST1_OUTPUT"]
+    report = task_import.import_csv(db_sess, _csv(
+        header,
+        ["информатика", "Сумма", STATEMENT, "легкая", "sum", "1 2", "3"],
+        ["химия", "Реакция", "Что получится?", "легкая", "", "", ""],
+        ["математика", "", "Без названия", "легкая", "", "", ""],
+        ["математика", "Корень", "Найдите корень", "невозможная", "", "", ""],
+    ), SUBJECTS)
+
+    assert (report.created, report.updated) == (1, 0)
+    assert [line for line, _ in report.errors] == [3, 4, 5]
+
+    report = task_import.import_csv(db_sess, _csv(
+        header,
+        ["информатика", "Сумма двух чисел", STATEMENT, "средняя", "sum", "2 2", "4"],
+    ), SUBJECTS)
+
+    assert (report.created, report.updated, report.errors) == (0, 1, [])
+    task = db_sess.query(Tasks).filter(Tasks.external_id == "sum").one()
+    assert (task.title, task.difficulty) == ("Сумма двух чисел", "средняя")
+    assert [(test.get_input(), test.get_output()) for test in task.task_tests] == [("2 2", "4")]
+
+
+def test_import_skips_duplicates_and_links_external_ids(db_sess):
+    dedup.attach(make_task(db_sess, title="Сумма", statement=STATEMENT))
+    db_sess.commit()
+    header = ["SUBJECT", "TITLE", "STATEMENT", "EXTERNAL_ID"]
+    report = task_import.import_csv(db_sess, _csv(
+        header,
+        ["информатика", "Сумма", STATEMENT + " ", ""],
+        ["информатика", "Сумма", STATEMENT, "sum"],
+        ["информатика", "Разность", "Даны два числа. Выведите модуль их разности.", ""],
+    ), SUBJECTS)
+
+    assert (report.created, report.duplicates, report.linked) == (1, 1, 1)
+    assert db_sess.query(Tasks).filter(Tasks.title == "Сумма").one().external_id == "sum"
+
+
+def test_exported_tasks_import_back(db_sess):
+    make_task(db_sess, title="Сумма", statement=STATEMENT, tests=(("1 2", "3"), ("2, 2", "4\n")))
+    rows = list(task_export.task_rows(db_sess, include_tests=True))
+    db_sess.query(TaskTest).delete()
+    db_sess.query(Tasks).delete()
+    db_sess.commit()
+
+    report = task_import.import_csv(db_sess, _csv(*rows), SUBJECTS)
+
+    assert (report.created, report.errors) == (1, [])
+    task = db_sess.query(Tasks).one()
+    assert (task.title, task.statement) == ("Сумма", STATEMENT)
+    assert [(test.get_input(), test.get_output()) for test in task.task_tests] == [("1 2", "3"), ("2, 2", "4\n")]
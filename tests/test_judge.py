@@ -0,0 +1,171 @@
+import io
+import os
+import time
+
+import pytest
+
+import judge
+import sandbox
+import storage
+from data import db_session
+from data.judge_jobs import JudgeJob
+from data.submissions import Submissions
+from data.task_tests import TaskTest
+from data.tasks import Tasks
+from helpers import make_task
+
+SLEEPER = """import os, sys, time
+data = sys.stdin.read().strip()
+if data.startswith("fail "):
+    # fail only once both sleepers have started, so stop_on_fail has something to cancel
+    while len(os.listdir(data[5:])) < 2:
+        time.sleep(0.01)
+    print("wrong")
+else:
+    with open(os.path.join(data, str(os.getpid())), "w"):
+        pass
+    time.sleep(1000)
+"""
+
+
+@pytest.fixture
+def pool(monkeypatch, tmp_path):
+    if not sandbox.available():
+        pytest.skip("sandbox pool needs fork")
+    storage.init(str(tmp_path / "storage"))
+    pool = sandbox.SandboxPool(3)
+    monkeypatch.setattr(judge, "_sandbox", pool)
+    monkeypatch.setitem(judge._config, "test_workers", 3)
+    yield pool
+    while not pool._idle.empty():
+        pool._idle.get().kill()
+
+
+@pytest.fixture
+def cold(monkeypatch, tmp_path):
+    if not sandbox.available():
+        pytest.skip("one-off runners need fork")
+    storage.init(str(tmp_path / "storage"))
+    monkeypatch.setattr(judge, "_sandbox", None)
+    monkeypatch.setitem(judge._config, "output_limit", 1024 ** 2)
+
+
+def _tests(*pairs):
+    tests = []
+    for input_data, output in pairs:
+        test = TaskTest()
+        test.set_data(input_data, output)
+        tests.append(test)
+    return tests
+
+
+def _gone(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    return False
+
+
+def test_stop_on_fail_kills_running_submissions(pool, tmp_path):
+    pids_dir = tmp_path / "pids"
+    pids_dir.mkdir()
+    runners = {runner.process.pid for runner in list(pool._idle.queue)}
+    task = Tasks(time_limit="30", memory_limit="256 MB")
+    tests = _tests((str(pids_dir), "1"), (str(pids_dir), "1"), (f"fail {pids_dir}", "1"))
+
+    started = time.monotonic()
+    verdict, passed, results = judge.run_tests(SLEEPER, task, tests, stop_on_fail=True)
+
+    assert time.monotonic() - started < 10
+    assert passed == 0
+    assert results[2][0] == "WA"
+    children = [int(name) for name in os.listdir(pids_dir)]
+    assert len(children) == 2
+    deadline = time.monotonic() + 5
+    while not all(_gone(pid) for pid in children) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert all(_gone(pid) for pid in children)
+    assert {runner.process.pid for runner in list(pool._idle.queue)} == runners
+    assert all(runner.alive() for runner in list(pool._idle.queue))
+
+
+def test_max_rss_counts_only_the_submission(pool):
+    task = Tasks(time_limit="5", memory_limit="256 MB")
+    source = "x = bytearray(int(input()) * 1024 * 1024)\nprint(len(x) // 1024 // 1024)\n"
+    verdict, passed, results = judge.run_tests(source, task, _tests(("0", "0"), ("1", "1"), ("20", "20")))
+
+    assert (verdict, passed) == ("OK", 3)
+    used = [result.max_rss / 1024 ** 2 for _, _, result in results]
+    assert used[0] < 0.5
+    assert 0.5 < used[1] < 2
+    assert 19 < used[2] < 22
+
+
+def test_pool_enforces_limits(pool, monkeypatch):
+    monkeypatch.setitem(judge._config, "output_limit", 64 * 1024)
+    task = Tasks(time_limit="0.5", memory_limit="64 MB")
+    cases = [
+        ("while True:\n    pass\n", judge.TIMEOUT_VERDICT),
+        ("x = bytearray(10 ** 9)\n", judge.MEMORY_VERDICT),
+        ("import sys\nsys.stderr.write('x' * 10 ** 6)\n", judge.OUTPUT_VERDICT),
+    ]
+    for source, expected in cases:
+        assert judge.run_tests(source, task, _tests(("", "1")))[:2] == (expected, 0)
+    assert all(runner.alive() for runner in list(pool._idle.queue))
+
+
+def _submit(client, task_id, source):
+    response = client.post(f"/информатика/task/{task_id}", data={"file": (io.BytesIO(source), "sol.py")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+
+
+def _submissions(task_id):
+    db_sess = db_session.create_session()
+    submissions = db_sess.query(Submissions).filter(Submissions.task_id == task_id).order_by(Submissions.id).all()
+    jobs = db_sess.query(JudgeJob).join(Submissions).filter(Submissions.task_id == task_id).count()
+    db_sess.close()
+    return submissions, jobs
+
+
+def test_queued_submission_is_judged_then_cached(client):
+    db_sess = db_session.create_session()
+    task_id = make_task(db_sess, title="Очередь", tests=(("1 2", "3"), ("5 5", "10"))).id
+    db_sess.close()
+    source = b"print(sum(map(int, input().split())))\n"
+
+    _submit(client, task_id, source)
+    deadline = time.monotonic() + 30
+    while _submissions(task_id)[0][0].verdict == judge.PENDING_VERDICT and time.monotonic() < deadline:
+        time.sleep(0.05)
+    submissions, jobs = _submissions(task_id)
+    assert [(s.verdict, s.total_tests) for s in submissions] == [("OK", 2)]
+    assert jobs == 1
+
+    _submit(client, task_id, source)
+    submissions, jobs = _submissions(task_id)
+    assert [(s.verdict, s.total_tests) for s in submissions] == [("OK", 2), ("OK", 2)]
+    assert jobs == 1
+
+
+def test_cold_run_stops_endless_output_early(cold):
+    task = Tasks(time_limit="5", memory_limit="256 MB")
+    started = time.monotonic()
+    flood_stdout = "while True:\n    print('x' * 1000)\n"
+    flood_stderr = "import sys\nwhile True:\n    sys.stderr.write('x' * 1000)\n"
+    results = [judge.run_tests(source, task, _tests(("", "1")))[2][0] for source in (flood_stdout, flood_stderr)]
+
+    assert time.monotonic() - started < 4
+    assert results[0][0] == "WA"
+    assert results[1][:2] == ("OL", judge.OUTPUT_VERDICT)
+
+
+def test_cold_run_reports_usage(cold):
+    task = Tasks(time_limit="5", memory_limit="256 MB")
+    verdict, passed, results = judge.run_tests("print(sum(map(int, input().split())))\n", task,
+                                               _tests(("1 2", "3"), ("5 5", "10")))
+
+    assert (verdict, passed) == ("OK", 2)
+    for status, _, result in results:
+        assert result.cpu_time is not None and result.max_rss is not None
@@ -0,0 +1,73 @@
+import sqlalchemy as sa
+
+import judge
+from data import db_session, migrations
+from data.db_session import SqlAlchemyBase
+from data.submissions import Submissions
+from data.tasks import Tasks
+from data.users import User
+from helpers import make_task, make_user
+
+
+def test_models_round_trip(db_sess):
+    user = make_user(db_sess)
+    task = make_task(db_sess, tests=(("1 2", "3"), ("5 5", "10")))
+    db_sess.add(Submissions(user_id=user.id, task_id=task.id, verdict="OK", total_tests=2, source_hash="0" * 64))
+    db_sess.commit()
+    user_id, task_id = user.id, task.id
+    db_sess.expunge_all()
+
+    task = db_sess.get(Tasks, task_id)
+    assert [(t.get_input(), t.get_output()) for t in task.task_tests] == [("1 2", "3"), ("5 5", "10")]
+    assert task.time_limit == "1.5"
+    assert task.memory_limit == "256 MB"
+    submission = db_sess.query(Submissions).one()
+    assert submission.user.check_password("secret")
+    assert submission.tasks.title == "Сумма"
+    assert db_sess.get(User, user_id).submissions[0].verdict == "OK"
+
+
+def test_limit_columns_keep_text(db_sess):
+    make_task(db_sess, title="a", time_limit="2", memory_limit="64")
+    make_task(db_sess, title="b", time_limit="0,5", memory_limit="1 GB")
+    make_task(db_sess, title="c", time_limit=None, memory_limit=None)
+    db_sess.expunge_all()
+
+    rows = {task.title: task for task in db_sess.query(Tasks)}
+    assert (rows["b"].time_limit, rows["b"].memory_limit) == ("0,5", "1 GB")
+    assert judge.parse_time_limit(rows["a"].time_limit) == 2.0
+    assert judge.parse_time_limit(rows["b"].time_limit) == 0.5
+    assert judge.parse_time_limit(rows["c"].time_limit) == judge.DEFAULT_TIME_LIMIT
+    assert judge.parse_memory_limit(rows["a"].memory_limit) == 64 * 1024 ** 2
+    assert judge.parse_memory_limit(rows["b"].memory_limit) == 1024 ** 3
+
+    assert [t.title for t in db_sess.query(Tasks).filter(Tasks.time_limit == "2")] == ["a"]
+    assert [t.title for t in db_sess.query(Tasks).filter(Tasks.memory_limit.like("%GB"))] == ["b"]
+    assert [t.title for t in db_sess.query(Tasks).filter(Tasks.time_limit.is_(None))] == ["c"]
+    titles = [t.title for t in db_sess.query(Tasks).filter(Tasks.time_limit.isnot(None)).order_by(Tasks.time_limit)]
+    assert titles == ["b", "a"]
+
+
+def test_upgrade_is_idempotent(engine):
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        versions = [row[0] for row in conn.execute(sa.text("SELECT version FROM schema_migrations ORDER BY version"))]
+    assert versions == [version for version, _, _ in migrations.MIGRATIONS]
+
+
+def test_copy_database(engine, db_sess, tmp_path):
+    source = str(tmp_path / "source.db")
+    source_engine = db_session.create_engine(source)
+    migrations.upgrade(source_engine)
+    with source_engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": 7, "name": "u", "email": "u@example.com"}])
+        conn.execute(Tasks.__table__.insert(), [{"id": 3, "subject": "физика", "title": "t", "time_limit": "1"}])
+    source_engine.dispose()
+    SqlAlchemyBase.metadata.drop_all(engine)
+    migrations.upgrade(engine)
+
+    copied = migrations.copy_database(source, engine.url.render_as_string(hide_password=False))
+    assert copied["users"] == 1 and copied["tasks"] == 1
+    task = make_task(db_sess, title="после копирования")
+    assert task.id > 3
+    assert db_sess.get(Tasks, 3).time_limit == "1"
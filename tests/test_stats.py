@@ -0,0 +1,82 @@
+import datetime
+
+import judge
+import stats
+from data.analytics_rollups import AnalyticsRollup
+from data.judge_jobs import JudgeJob
+from data.submissions import Submissions, PENDING_VERDICT
+from data.test_results import TestResult as Result
+from data.user_task_stats import UserTaskStats
+from helpers import make_task, make_user
+
+
+def _submit(db_sess, user, task, verdict, age=datetime.timedelta()):
+    submission = Submissions(user_id=user.id, task_id=task.id, verdict=verdict, total_tests=1,
+                             created_at=datetime.datetime.now() - age)
+    db_sess.add(submission)
+    db_sess.commit()
+    return submission
+
+
+def _rolled_up(db_sess):
+    return sum(row.total for row in db_sess.query(AnalyticsRollup).filter(AnalyticsRollup.period == "day"))
+
+
+def test_fresh_pending_submission_holds_rollup(db_sess):
+    user, task = make_user(db_sess), make_task(db_sess)
+    _submit(db_sess, user, task, "OK")
+    _submit(db_sess, user, task, PENDING_VERDICT)
+    _submit(db_sess, user, task, "OK")
+
+    while stats.run_rollup(db_sess):
+        pass
+    assert _rolled_up(db_sess) == 1
+
+
+def test_stale_pending_submission_does_not_stall_rollup(db_sess):
+    user, task = make_user(db_sess), make_task(db_sess)
+    _submit(db_sess, user, task, PENDING_VERDICT, age=stats.PENDING_TIMEOUT * 2)
+    _submit(db_sess, user, task, "OK")
+    _submit(db_sess, user, task, "OK")
+
+    while stats.run_rollup(db_sess):
+        pass
+    assert _rolled_up(db_sess) == 3
+
+
+def test_recover_fails_submissions_without_a_job(db_sess):
+    user, task = make_user(db_sess), make_task(db_sess)
+    orphan = _submit(db_sess, user, task, PENDING_VERDICT)
+    queued = _submit(db_sess, user, task, PENDING_VERDICT)
+    interrupted = _submit(db_sess, user, task, PENDING_VERDICT)
+    db_sess.add_all([JudgeJob(submission_id=queued.id), JudgeJob(submission_id=interrupted.id, status="running")])
+    db_sess.commit()
+
+    fresh = _submit(db_sess, user, task, PENDING_VERDICT, age=-datetime.timedelta(minutes=1))
+
+    pending = judge._recover(db_sess, datetime.datetime.now())
+    db_sess.expire_all()
+    assert orphan.verdict == judge.SYSTEM_ERROR_VERDICT
+    assert queued.verdict == interrupted.verdict == fresh.verdict == PENDING_VERDICT
+    assert len(pending) == 2
+    assert {job.status for job in db_sess.query(JudgeJob)} == {"pending"}
+
+
+def test_remove_submission_clears_references(db_sess):
+    user, task = make_user(db_sess), make_task(db_sess)
+    first = _submit(db_sess, user, task, "Частичное решение", age=datetime.timedelta(minutes=5))
+    stats.record_submission(db_sess, first)
+    best = _submit(db_sess, user, task, "OK")
+    stats.record_submission(db_sess, best)
+    best.test_results.append(Result(test_id=task.task_tests[0].id, status="OK"))
+    db_sess.add(JudgeJob(submission_id=best.id, status="done"))
+    db_sess.commit()
+    assert db_sess.query(UserTaskStats).one().best_submission_id == best.id
+
+    stats.remove_submission(db_sess, best)
+    db_sess.commit()
+
+    row = db_sess.query(UserTaskStats).one()
+    assert (row.attempts, row.solved, row.best_submission_id) == (1, False, first.id)
+    assert db_sess.query(JudgeJob).count() == 0
+    assert db_sess.query(Result).count() == 0
@@ -0,0 +1,39 @@
+import io
+
+import judge
+from data import db_session
+from data.submissions import Submissions
+from data.users import User
+
+
+def test_submission_to_missing_task_is_404(client):
+    response = client.post("/информатика/task/9999", data={"file": (io.BytesIO(b"print(1)\n"), "sol.py")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 404
+    db_sess = db_session.create_session()
+    assert db_sess.query(Submissions).filter(Submissions.task_id == 9999).count() == 0
+    db_sess.close()
+
+
+def test_unknown_pvp_room_is_404(client):
+    assert client.get("/информатика/pvp/room/missing").status_code == 404
+
+
+def test_first_request_starts_judge_workers(client):
+    client.get("/")
+    assert judge._workers
+
+
+def test_verdict_event_names_its_task(app, client):
+    import main
+
+    db_sess = db_session.create_session()
+    user = db_sess.query(User).filter(User.email == "admin@example.com").one()
+    socket = main.socketio.test_client(app, flask_test_client=client)
+    socket.emit("join", {"room": f"judge_{user.id}"})
+    main.on_judged(Submissions(id=1, user_id=user.id, task_id=7, verdict="OK", total_tests=3), None)
+    db_sess.close()
+
+    events = [event for event in socket.get_received() if event["name"] == "verdict"]
+    socket.disconnect()
+    assert [event["args"][0]["task_id"] for event in events] == [7]
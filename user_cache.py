@@ -0,0 +1,62 @@
+import threading
+import time
+
+from flask_login import UserMixin
+
+DEFAULT_TTL = 30
+
+_entries = {}
+_lock = threading.Lock()
+_config = {"ttl": DEFAULT_TTL}
+
+
+class CachedUser(UserMixin):
+    def __init__(self, id, name, admin, ban, elo_rating):
+        self.id = id
+        self.name = name
+        self.admin = admin
+        self.ban = ban
+        self.elo_rating = elo_rating
+
+
+def init(ttl=DEFAULT_TTL):
+    _config["ttl"] = max(0, ttl)
+    clear()
+
+
+def get(user_id, loader):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+    if entry is not None and entry[0] > now:
+        return CachedUser(**entry[1])
+    user = loader(user_id)
+    if user is None:
+        invalidate(user_id)
+        return None
+    snapshot = {
+        "id": user.id,
+        "name": user.name,
+        "admin": bool(user.admin),
+        "ban": bool(user.ban),
+        "elo_rating": user.elo_rating
+    }
+    if _config["ttl"]:
+        with _lock:
+            _entries[user_id] = (now + _config["ttl"], snapshot)
+    return CachedUser(**snapshot)
+
+
+def invalidate(*user_ids):
+    with _lock:
+        for user_id in user_ids:
+            _entries.pop(int(user_id), None)
+
+
+def clear():
+    with _lock:
+        _entries.clear()